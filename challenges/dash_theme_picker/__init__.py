@@ -1,4 +1,5 @@
 from . import hooks 
+from .theme_utils import custom_template, preset_template, theme_template
 
 def plug(app):
     pass
\ No newline at end of file
@@ -1,10 +1,32 @@
-from dash import html, dcc, hooks, Input, Output
+from dash import html, dcc, hooks, Input, Output, State
 import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
-from .theme_utils import get_theme
+from .theme_utils import get_theme_presets
+
+# Color pickers only report a value once the user pauses dragging for this long (ms)
+COLOR_DEBOUNCE_MS = 150
+
+THEME_PRESETS = get_theme_presets()
+
+DEMO_FIGURE = go.Figure(go.Scatter(x=[1, 2, 3], y=[3, 1, 2]))
+
+
+def find_graph_ids(layout):
+    """Ids of every dcc.Graph in the host layout, so the theme can restyle them all."""
+    roots = layout if isinstance(layout, (list, tuple)) else [layout]
+    ids = []
+    for root in roots:
+        if not hasattr(root, "_traverse"):
+            continue
+        for component in [root, *root._traverse()]:
+            if isinstance(component, dcc.Graph) and getattr(component, "id", None) is not None:
+                ids.append(component.id)
+    return ids
+
 
 @hooks.layout()
 def layout(existing_layout):
+    host_layout = existing_layout if existing_layout is not None else []
     return html.Div([
         dcc.RadioItems(
             id="theme-mode",
@@ -19,45 +41,64 @@ def layout(existing_layout):
         html.Div(id="custom-color-inputs", children=[
             dbc.CardGroup([
                 dbc.Label("Background color", html_for="bg-color"),
-                dbc.Input(type="color", id="bg-color", value="#ffffff", disabled=True),
+                dbc.Input(type="color", id="bg-color", value="#ffffff", disabled=True, debounce=COLOR_DEBOUNCE_MS),
             ], style={"marginBottom": "1rem"}),
             dbc.CardGroup([
                 dbc.Label("Text color", html_for="text-color"),
-                dbc.Input(type="color", id="text-color", value="#000000", disabled=True),
+                dbc.Input(type="color", id="text-color", value="#000000", disabled=True, debounce=COLOR_DEBOUNCE_MS),
             ]),
         ], style={"display": "none", "gap": "1rem", "marginBottom": "1rem"}),
-        dcc.Graph(id="theme-graph")
+        dcc.Store(id="theme-presets", data=THEME_PRESETS),
+        dcc.Store(id="theme-graph-ids", data=["theme-graph"] + find_graph_ids(host_layout)),
+        dcc.Store(id="theme-picker-state"),
+        dcc.Graph(id="theme-graph", figure=DEMO_FIGURE),
+        html.Div(host_layout, id="theme-host-content"),
     ], id="app-container")
 
-@hooks.callback(
+# Applied in the browser: every graph in the layout gets the compiled template
+# patched into layout.template and nothing else, so theme switches and color
+# picker drags never hit the server. Custom themes fill the picked colors into
+# the uncolored custom base template.
+hooks.clientside_callback(
+    """
+    function(mode, bg, text, presets, graphIds) {
+        var custom = mode === "custom";
+        var preset = presets[mode] || presets.light;
+        var style = custom ? {backgroundColor: bg, color: text} : preset.layout_style;
+        var template = preset.template;
+        if (custom) {
+            var layout = Object.assign({}, template.layout, {
+                paper_bgcolor: bg,
+                plot_bgcolor: bg,
+                font: Object.assign({}, (template.layout || {}).font, {color: text})
+            });
+            template = Object.assign({}, template, {layout: layout});
+        }
+        var api = window.dash_component_api;
+        (graphIds || []).forEach(function(id) {
+            var graph = api && api.getLayout(id);
+            var figure = graph && graph.props && graph.props.figure;
+            if (!figure) {
+                return;
+            }
+            var patched = Object.assign({}, figure, {
+                layout: Object.assign({}, figure.layout, {template: template})
+            });
+            window.dash_clientside.set_props(id, {figure: patched});
+        });
+        return [style, {mode: mode, bg: bg, text: text}, !custom, !custom];
+    }
+    """,
     Output("app-container", "style"),
-    Output("theme-graph", "figure"),
+    Output("theme-picker-state", "data"),
     Output("bg-color", "disabled"),
     Output("text-color", "disabled"),
     Input("theme-mode", "value"),
     Input("bg-color", "value"),
     Input("text-color", "value"),
+    State("theme-presets", "data"),
+    State("theme-graph-ids", "data"),
 )
-def update_theme(mode, bg, text):
-    if mode == "custom":
-        custom_colors = {"bg": bg, "text": text}
-    else:
-        custom_colors = None
-        
-    custom_colors = {"bg": bg, "text": text} if mode == "custom" else None
-    theme = get_theme(mode, custom_colors)
-    fig = go.Figure(go.Scatter(x=[1, 2, 3], y=[3, 1, 2]))
-    fig.update_layout(template=theme["plotly_template"])
-    bg_color = theme["layout_style"].get("backgroundColor", "#FFFFFF")
-    text_color = theme["layout_style"].get("color", "#000000")
-    fig.update_layout(
-        paper_bgcolor=bg_color,
-        plot_bgcolor=bg_color,
-        font=dict(color=text_color)
-    )
-    bg_disabled = mode != "custom"
-    text_disabled = mode != "custom"
-    return theme["layout_style"], fig, bg_disabled, text_disabled
 
 @hooks.callback(
     Output("custom-color-inputs", "style"),
@@ -1,3 +1,11 @@
+from functools import lru_cache
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+TEMPLATE_PREFIX = "theme_picker_"
+
+
 def get_theme(mode, custom_colors=None):
     if mode == "dark":
         return {
@@ -17,3 +25,63 @@ def get_theme(mode, custom_colors=None):
             "layout_style": {"backgroundColor": "#FFFFFF", "color": "#000000"},
             "plotly_template": "plotly_white"
         }
+
+
+def _compile_template(name, base, bg, text):
+    '''Register `base` with the theme colors baked into its layout under `name`.'''
+    template = go.layout.Template(pio.templates[base])
+    template.layout.paper_bgcolor = bg
+    template.layout.plot_bgcolor = bg
+    template.layout.font.color = text
+    pio.templates[name] = template
+    return name
+
+
+@lru_cache(maxsize=None)
+def preset_template(mode):
+    '''Name of the compiled plotly.io template for "light" or "dark", registered on first use.'''
+    theme = get_theme(mode)
+    style = theme["layout_style"]
+    return _compile_template(f"{TEMPLATE_PREFIX}{mode}", theme["plotly_template"],
+                             style["backgroundColor"], style["color"])
+
+
+@lru_cache(maxsize=128)
+def custom_template(bg, text):
+    '''Compiled template for a custom color pair, registered once per pair.'''
+    theme = get_theme("custom", {"bg": bg, "text": text})
+    name = f"{TEMPLATE_PREFIX}custom_{bg.lstrip('#')}_{text.lstrip('#')}".lower()
+    return _compile_template(name, theme["plotly_template"], bg, text)
+
+
+def theme_template(state):
+    '''
+    Template name for the picker state stored in "theme-picker-state"
+    ({"mode": ..., "bg": ..., "text": ...}), for figures built server-side.'''
+    state = state or {}
+    if state.get("mode") == "custom" and state.get("bg") and state.get("text"):
+        return custom_template(state["bg"], state["text"])
+    return preset_template("dark" if state.get("mode") == "dark" else "light")
+
+
+@lru_cache(maxsize=None)
+def _template_json(name):
+    return pio.templates[name].to_plotly_json()
+
+
+def get_theme_presets():
+    '''
+    Compiled templates in the form the clientside callback needs: the browser
+    cannot look templates up by name, so each one is resolved to JSON once.
+    "custom" is the uncolored base that the browser fills in with the picked colors.'''
+    presets = {}
+    for mode in ("light", "dark"):
+        presets[mode] = {
+            "layout_style": get_theme(mode)["layout_style"],
+            "template": _template_json(preset_template(mode)),
+        }
+    presets["custom"] = {
+        "layout_style": get_theme("light")["layout_style"],
+        "template": _template_json(get_theme("custom", {"bg": "", "text": ""})["plotly_template"]),
+    }
+    return presets
@@ -0,0 +1,187 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_TEMPLATE = 'plotly'
+DATA_KEYS = ('x', 'y', 'lat', 'lon', 'text', 'hovertext', 'customdata')
+DASH_SEQUENCE = ['solid', 'dot', 'dash', 'longdash', 'dashdot', 'longdashdot']
+
+
+@lru_cache(maxsize=None)
+def expand_template(name=DEFAULT_TEMPLATE):
+    '''
+    A named plotly.io template as a plain dict, resolved once. The same dict is
+    shared by every figure built with it, so treat it as read-only.'''
+    return pio.templates[name].to_plotly_json()
+
+
+def colorway(template=DEFAULT_TEMPLATE):
+    return expand_template(template)['layout'].get('colorway') or pio.templates['plotly'].layout.colorway
+
+
+def array(values):
+    '''
+    Trace data in the form the encoder handles fastest: numbers as a
+    contiguous ndarray, everything else (strings, categories) as a list.'''
+    values = np.asarray(values)
+    if values.dtype.kind in 'biuf':
+        return np.ascontiguousarray(values)
+    if values.dtype.kind == 'M':
+        return np.datetime_as_string(values, unit='s').tolist()
+    return values.tolist()
+
+
+def trace(kind, **props):
+    for key in DATA_KEYS:
+        if props.get(key) is not None and not isinstance(props[key], str):
+            props[key] = array(props[key])
+    return dict(type=kind, **props)
+
+
+def scatter(x, y, **props):
+    return trace('scatter', x=x, y=y, **props)
+
+
+def scattergl(x, y, **props):
+    return trace('scattergl', x=x, y=y, **props)
+
+
+def bar(x, y, **props):
+    return trace('bar', x=x, y=y, orientation='v', **props)
+
+
+def scattergeo(lat, lon, **props):
+    return trace('scattergeo', lat=lat, lon=lon, **props)
+
+
+def groups(n, color=None, line_dash=None, colors=None, template=DEFAULT_TEMPLATE):
+    '''
+    Split n rows the way plotly.express splits `color=` / `line_dash=`.
+
+    `color` and `line_dash` are (label, keys) pairs. Returns one dict per
+    distinct combination with its row 'index', legend 'name' ("a, b"), the
+    (label, value) 'fields' for the hover text, and its 'color' / 'dash' picked
+    by the position of each key among that field's distinct values.'''
+    colors = colors or colorway(template)
+    specs = [(role, label, *pd.factorize(np.asarray(keys)))
+             for role, spec in (('color', color), ('dash', line_dash)) if spec is not None
+             for label, keys in [spec]]
+    combined = np.zeros(n, dtype=np.int64)
+    valid = np.ones(n, dtype=bool)
+    for _, _, codes, uniques in specs:
+        combined = combined * len(uniques) + codes
+        valid &= codes >= 0
+    rows = np.flatnonzero(valid)
+    if not len(rows):
+        return []
+
+    # Combined codes order groups by the first field's keys, then the second's, as px does
+    keys = combined[rows]
+    order = np.argsort(keys, kind='stable')
+    starts = np.flatnonzero(np.r_[True, np.diff(keys[order]) != 0])
+    result = []
+    for sub in np.split(order, starts[1:]):
+        index = rows[sub]
+        first = index[0]
+        group = {'index': index, 'fields': [], 'color': colors[0], 'dash': DASH_SEQUENCE[0]}
+        for role, label, codes, uniques in specs:
+            code = codes[first]
+            group['fields'].append((label, uniques[code]))
+            if role == 'color':
+                group['color'] = colors[code % len(colors)]
+            else:
+                group['dash'] = DASH_SEQUENCE[code % len(DASH_SEQUENCE)]
+        group['name'] = ', '.join(str(value) for _, value in group['fields'])
+        result.append(group)
+    return result
+
+
+def hover(*fields, name=False):
+    '''px-style hovertemplate: optional bold hover name, then "label=value" lines.'''
+    head = '<b>%{hovertext}</b><br><br>' if name else ''
+    return head + '<br>'.join(f'{label}={value}' for label, value in fields) + '<extra></extra>'
+
+
+def px_bars(x, y, x_label, y_label, color=None, colors=None, template=DEFAULT_TEMPLATE, hovertemplate=None,
+            **props):
+    '''Traces equivalent to px.bar(x=..., y=..., color=...); `hovertemplate` replaces the px one.'''
+    x, y = np.asarray(x), np.asarray(y)
+    traces = []
+    for group in groups(len(x), color=color, colors=colors, template=template):
+        idx, name = group['index'], group['name']
+        traces.append(bar(x[idx], y[idx], name=name, legendgroup=name, offsetgroup=name, alignmentgroup='True',
+                          showlegend=color is not None, marker={'color': group['color']},
+                          hovertemplate=hovertemplate or hover(*group['fields'], (x_label, '%{x}'), (y_label, '%{y}')),
+                          **props))
+    return traces
+
+
+def px_lines(x, y, x_label, y_label, color=None, line_dash=None, colors=None, template=DEFAULT_TEMPLATE,
+             build=scatter, hovertemplate=None, **props):
+    '''Traces equivalent to px.line(x=..., y=..., color=..., line_dash=...); `hovertemplate` replaces the px one.'''
+    x, y = np.asarray(x), np.asarray(y)
+    traces = []
+    for group in groups(len(x), color=color, line_dash=line_dash, colors=colors, template=template):
+        idx, name = group['index'], group['name']
+        traces.append(build(x[idx], y[idx], mode='lines', name=name, legendgroup=name,
+                            showlegend=color is not None or line_dash is not None,
+                            line={'color': group['color'], 'dash': group['dash']},
+                            hovertemplate=hovertemplate or hover(*group['fields'], (x_label, '%{x}'), (y_label, '%{y}')),
+                            **props))
+    return traces
+
+
+def px_layout(title=None, x_title=None, y_title=None, legend_title=None, **layout):
+    '''The layout plotly.express writes for a single-panel cartesian figure.'''
+    base = {'legend': {'tracegroupgap': 0}, 'margin': {'t': 60}}
+    if title is not None:
+        base['title'] = {'text': title}
+    if x_title is not None:
+        base['xaxis'] = {'anchor': 'y', 'domain': [0.0, 1.0], 'title': {'text': x_title}}
+    if y_title is not None:
+        base['yaxis'] = {'anchor': 'x', 'domain': [0.0, 1.0], 'title': {'text': y_title}}
+    if legend_title is not None:
+        base['legend']['title'] = {'text': legend_title}
+    for key, value in layout.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            base[key] = {**base[key], **value}
+        else:
+            base[key] = value
+    return base
+
+
+def figure(data, layout=None, template=DEFAULT_TEMPLATE):
+    '''A figure dict dcc.Graph accepts as-is; no property validation is run.'''
+    return {'data': data, 'layout': {**(layout or {}), 'template': expand_template(template)}}
+
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def to_json(fig):
+    '''Serialize a figure dict; ndarrays are written directly by orjson when it is installed.'''
+    if orjson is not None:
+        return orjson.dumps(fig, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    return pio.json.to_json_plotly(fig, engine='json')
+
+
+def enable_fast_json():
+    '''
+    Have plotly (and therefore Dash, which encodes callback responses through
+    plotly.io.json) use orjson when it is installed.'''
+    if orjson is not None:
+        pio.json.config.default_engine = 'orjson'
+    return pio.json.config.default_engine
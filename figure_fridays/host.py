@@ -0,0 +1,268 @@
+'''
+One process serving every weekly app, each under its own path:
+
+    python -m figure_fridays.host                       # http://127.0.0.1:8050/
+    gunicorn -w 1 --threads 8 figure_fridays.host:application
+
+A week's module (and with it its dataset and model) is imported on the first
+visit to its page, not at startup. Pages are kept in least-recently-used
+order; once their memory exceeds HOST_MEMORY_BUDGET_MB, idle pages
+are unloaded and come back on their next visit. A page's memory is the larger
+of what importing it added to the resident set and the deep size of the objects
+it registered with figure_fridays.memory (as last sampled), so caches that grow
+after import count too. /_host reports each page's state, load time and memory;
+/_host/memory lists the registered objects. Both answer local requests only.
+
+Run from the repo root. The apps stay plain Dash apps, importing their helpers
+as figure_fridays.week_NN modules; each is imported with
+DASH_REQUESTS_PATHNAME_PREFIX set to its page path.
+'''
+import ctypes
+import gc
+import html
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+
+from werkzeug.wsgi import ClosingIterator
+
+from figure_fridays.lazy import IMPORT_LOCK
+from figure_fridays.memory import REGISTRY, rss
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MEMORY_BUDGET_MB = float(os.environ.get('HOST_MEMORY_BUDGET_MB', '1500'))
+STATUS_PATH = '_host'
+LOCAL_ADDRS = ('127.0.0.1', '::1', None)
+# Imported once with the host, so a page's resident size is its own data and
+# objects rather than the library stack every page shares
+SHARED_IMPORTS = ('numpy', 'pandas', 'plotly.graph_objects', 'dash', 'dash_bootstrap_components')
+
+
+def release_memory():
+    '''Collect garbage and hand freed heap pages back to the OS where glibc allows it.'''
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class Page:
+    '''One weekly app: `path` is its entry script in this repo.'''
+
+    def __init__(self, slug, title, path):
+        self.slug = slug
+        self.title = title
+        self.path = os.path.join(ROOT, path)
+        self.module = f"figure_fridays_host_{slug.replace('-', '_')}"
+        self.state = 'cold'
+        self.app = None
+        self.modules = []
+        self.load_seconds = None
+        # Resident set growth while the page was imported
+        self.resident = 0
+        self.loads = 0
+        self.evictions = 0
+        self.active = 0
+        self.last_used = None
+        self.error = None
+
+    def objects(self):
+        return REGISTRY.total(owner=self.module) if self.app else 0
+
+    def size(self):
+        '''Bytes charged to the page against the host's budget.'''
+        return max(self.resident, self.objects()) if self.app else 0
+
+    def status(self):
+        return {
+            'title': self.title,
+            'state': self.state,
+            'load_seconds': self.load_seconds,
+            'resident_mb': round(self.resident / 2**20, 1),
+            # Deep size of the objects the page registered with figure_fridays.memory, as last sampled
+            'objects_mb': round(self.objects() / 2**20, 1),
+            'charged_mb': round(self.size() / 2**20, 1),
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'active_requests': self.active,
+            'idle_seconds': None if self.last_used is None else round(time.time() - self.last_used, 1),
+            'error': self.error,
+        }
+
+
+PAGES = [
+    Page('week-19', 'Week 19 · TLC driver applications', 'figure_fridays/week_19/tlc_driver_dash.py'),
+    Page('week-20', 'Week 20 · US dams', 'figure_fridays/week_20/main.py'),
+    Page('week-21', 'Week 21 · CO2 emissions forecast', 'figure_fridays/week_21/app/main.py'),
+    Page('week-27', 'Week 27 · Groundwater salinity in 3D', 'figure_fridays/week_27/main.py'),
+    Page('week-30', 'Week 30 · European electricity', 'figure_fridays/week_30/app/main.py'),
+]
+
+
+class Host:
+    '''WSGI app dispatching /<slug>/... to the page's Dash server, loading it on demand.'''
+
+    def __init__(self, pages=PAGES, budget_mb=MEMORY_BUDGET_MB, local_only=True):
+        self.pages = {page.slug: page for page in pages}
+        self.budget = budget_mb * 2**20
+        self.local_only = local_only
+        self.lock = threading.Lock()
+        self.started = time.time()
+        # Status pages read the sampler's latest sizes instead of measuring on each request
+        REGISTRY.start_sampling()
+        with IMPORT_LOCK:
+            for name in SHARED_IMPORTS:
+                importlib.import_module(name)
+
+    # Loading and eviction
+    def load(self, page):
+        '''
+        Import the page's module under its own name.
+        Runs under IMPORT_LOCK: the pathname prefix is set process-wide while the
+        app is created, and apps using figure_fridays.lazy hold their requests while it is taken.'''
+        with IMPORT_LOCK:
+            if page.app is not None:
+                return page.app
+            page.state = 'loading'
+            name = page.module
+            spec = importlib.util.spec_from_file_location(name, page.path)
+            module = importlib.util.module_from_spec(spec)
+            before_modules = set(sys.modules)
+            before_rss = rss()
+            start = time.perf_counter()
+            prefix = os.environ.get('DASH_REQUESTS_PATHNAME_PREFIX')
+            os.environ['DASH_REQUESTS_PATHNAME_PREFIX'] = f'/{page.slug}/'
+            page_dir = os.path.dirname(page.path)
+            sys.modules[name] = module
+            try:
+                spec.loader.exec_module(module)
+            except Exception as err:
+                sys.modules.pop(name, None)
+                page.state, page.error = 'error', repr(err)
+                raise
+            finally:
+                if prefix is None:
+                    os.environ.pop('DASH_REQUESTS_PATHNAME_PREFIX', None)
+                else:
+                    os.environ['DASH_REQUESTS_PATHNAME_PREFIX'] = prefix
+
+            # The page's own modules (its helpers), so eviction can drop them too
+            page.modules = [name] + [
+                mod for mod in set(sys.modules) - before_modules
+                if (getattr(sys.modules[mod], '__file__', None) or '').startswith(page_dir) and mod != name
+            ]
+            page.app = module.app.server
+            page.load_seconds = round(time.perf_counter() - start, 3)
+            page.resident = max(rss() - before_rss, 0)
+            page.loads += 1
+            page.state, page.error = 'warm', None
+            return page.app
+
+    def evict(self, page):
+        with IMPORT_LOCK:
+            if page.app is None or page.active:
+                return False
+            page.app = None
+            REGISTRY.unregister(owner=page.module)
+            for mod in page.modules:
+                sys.modules.pop(mod, None)
+            page.modules = []
+            page.state = 'cold'
+            page.resident = 0
+            page.evictions += 1
+        release_memory()
+        return True
+
+    def enforce_budget(self, keep=None):
+        '''Unload idle pages, least recently used first, until the loaded ones fit the budget.'''
+        while sum(page.size() for page in self.pages.values()) > self.budget:
+            idle = [page for page in self.pages.values()
+                    if page.app is not None and page is not keep and not page.active]
+            if not idle:
+                return
+            self.evict(min(idle, key=lambda page: page.last_used or 0))
+
+    def acquire(self, page):
+        with self.lock:
+            page.active += 1
+            page.last_used = time.time()
+        try:
+            return page.app or self.load(page)
+        except Exception:
+            self.release(page)
+            raise
+
+    def release(self, page):
+        with self.lock:
+            page.active -= 1
+        self.enforce_budget(keep=page)
+
+    # WSGI
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '') or '/'
+        slug, _, rest = path.lstrip('/').partition('/')
+        page = self.pages.get(slug)
+        if slug == STATUS_PATH:
+            if self.local_only and environ.get('REMOTE_ADDR') not in LOCAL_ADDRS:
+                return self.respond(start_response, '404 Not Found', 'text/plain', 'Not Found')
+            body = REGISTRY.report() if rest == 'memory' else self.status()
+            return self.respond(start_response, '200 OK', 'application/json', json.dumps(body))
+        if page is None:
+            return self.respond(start_response, '200 OK', 'text/html; charset=utf-8', self.index())
+        if not path.startswith(f'/{slug}/'):
+            start_response('308 Permanent Redirect', [('Location', f'{environ.get("SCRIPT_NAME", "")}/{slug}/')])
+            return [b'']
+
+        try:
+            server = self.acquire(page)
+        except Exception as err:
+            return self.respond(start_response, '500 Internal Server Error', 'text/plain',
+                                f'{page.title} failed to load: {err!r}')
+        environ = dict(environ, SCRIPT_NAME=environ.get('SCRIPT_NAME', '') + f'/{slug}', PATH_INFO=f'/{rest}')
+        try:
+            body = server(environ, start_response)
+        except BaseException:
+            # No iterator to close, so release here or the page could never be evicted
+            self.release(page)
+            raise
+        return ClosingIterator(body, [lambda: self.release(page)])
+
+    def respond(self, start_response, status, content_type, body):
+        data = body.encode('utf-8')
+        start_response(status, [('Content-Type', content_type), ('Content-Length', str(len(data)))])
+        return [data]
+
+    def status(self):
+        return {
+            'uptime': round(time.time() - self.started, 1),
+            'rss_mb': round(rss() / 2**20, 1),
+            'budget_mb': round(self.budget / 2**20, 1),
+            'pages': {slug: page.status() for slug, page in self.pages.items()},
+        }
+
+    def index(self):
+        rows = ''.join(
+            f'<li><a href="{slug}/">{html.escape(page.title)}</a> '
+            f'<small>{page.state}'
+            f'{"" if page.load_seconds is None else f", loaded in {page.load_seconds:.2f} s"}'
+            f'{"" if not page.size() else f", {page.size() / 2**20:.0f} MB"}</small></li>'
+            for slug, page in self.pages.items()
+        )
+        return (
+            '<!DOCTYPE html><html><head><title>Figure Fridays</title></head>'
+            '<body style="font-family: sans-serif; background: #121212; color: #fff; padding: 2rem;">'
+            f'<h1>Figure Fridays</h1><ul>{rows}</ul>'
+            f'<p><a href="{STATUS_PATH}">status</a></p></body></html>'
+        )
+
+
+application = Host()
+
+
+if __name__ == '__main__':
+    from werkzeug.serving import run_simple
+    run_simple('127.0.0.1', int(os.environ.get('PORT', '8050')), application, threaded=True)
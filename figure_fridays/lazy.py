@@ -0,0 +1,135 @@
+import threading
+import time
+
+import flask
+
+# Held while a loader imports modules. plotly's JSON encoder looks pandas and
+# numpy up in sys.modules and fails on a half-imported one, so app requests
+# wait here while such an import runs in the background.
+IMPORT_LOCK = threading.RLock()
+
+# A failed load is retried by warm_in_background after this many seconds, doubling per failure
+RETRY_SECONDS = 5
+MAX_RETRY_SECONDS = 300
+
+
+class LazyResource:
+    '''
+    A dataset, model or heavy import that is built on first use instead of at
+    module import. Thread-safe: concurrent callers wait for the single load.
+    Its state ("cold", "loading", "warm" or "error") feeds the health routes;
+    a failed load is tried again on the next get().
+    Loaders that import pandas/numpy should pass imports=True.'''
+
+    def __init__(self, name, loader, imports=False):
+        self.name = name
+        self.loader = loader
+        self.imports = imports
+        self.state = "cold"
+        self.seconds = None
+        self.error = None
+        self.failures = 0
+        self.failed_at = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state == "warm"
+
+    def get(self):
+        if self.state == "warm":
+            return self._value
+        with self._lock:
+            if self.state != "warm":
+                self.state = "loading"
+                start = time.perf_counter()
+                try:
+                    if self.imports:
+                        with IMPORT_LOCK:
+                            self._value = self.loader()
+                    else:
+                        self._value = self.loader()
+                except Exception as err:
+                    self.state, self.error = "error", repr(err)
+                    self.failures += 1
+                    self.failed_at = time.monotonic()
+                    raise
+                self.seconds = time.perf_counter() - start
+                self.state, self.error, self.failures = "warm", None, 0
+        return self._value
+
+    def retry_due(self):
+        if self.state != "error":
+            return False
+        wait = min(RETRY_SECONDS * 2 ** (self.failures - 1), MAX_RETRY_SECONDS)
+        return time.monotonic() - self.failed_at >= wait
+
+    def status(self):
+        return {"state": self.state, "seconds": self.seconds, "error": self.error, "failures": self.failures}
+
+
+def warm_in_background(resources):
+    '''
+    Load the still-cold `resources`, and failed ones whose retry backoff has
+    passed, in a daemon thread so the server can answer while they warm up.
+    Returns the thread, or None if nothing needed loading.'''
+    pending = [resource for resource in resources if resource.state == "cold" or resource.retry_due()]
+    if not pending:
+        return None
+    # Marked before the thread starts, so callers see the retry and don't queue another
+    for resource in pending:
+        resource.state = "loading"
+
+    def warm():
+        for resource in pending:
+            try:
+                resource.get()
+            except Exception:
+                pass  # kept on the resource and reported by /healthz
+
+    thread = threading.Thread(target=warm, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def overall_state(resources):
+    states = [resource.state for resource in resources]
+    if all(state == "warm" for state in states):
+        return "warm"
+    if "error" in states:
+        return "error"
+    if "loading" in states or "warm" in states:
+        return "warming"
+    return "cold"
+
+
+def add_health_routes(server, resources, path="/healthz"):
+    '''
+    `path` always answers 200 (liveness) with the overall and per-resource
+    state; `path`/ready answers 503 until every resource is warm (readiness).
+    Other requests wait for any import running under IMPORT_LOCK.'''
+    started = time.time()
+    ready_path = path.rstrip("/") + "/ready"
+
+    @server.before_request
+    def wait_for_imports():
+        if flask.request.path not in (path, ready_path):
+            with IMPORT_LOCK:
+                pass
+
+    def payload():
+        return {
+            "status": overall_state(resources),
+            "uptime": round(time.time() - started, 3),
+            "resources": {resource.name: resource.status() for resource in resources},
+        }
+
+    @server.route(path)
+    def healthz():
+        return flask.jsonify(payload())
+
+    @server.route(ready_path)
+    def readyz():
+        body = payload()
+        return flask.jsonify(body), 200 if body["status"] == "warm" else 503
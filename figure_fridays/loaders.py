@@ -0,0 +1,67 @@
+import hashlib
+import os
+import warnings
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 100_000
+
+
+def list_members(zip_path, suffix='.csv'):
+    with zipfile.ZipFile(zip_path) as zf:
+        return [name for name in zf.namelist() if name.endswith(suffix)]
+
+
+def downcast_floats(df):
+    '''Store float64 columns as float32 (halves their memory, ~7 significant digits).'''
+    float_cols = df.select_dtypes(include=['float64']).columns
+    if len(float_cols):
+        df = df.astype({col: np.float32 for col in float_cols})
+    return df
+
+
+def _cache_path(zip_path, member, schema, usecols, downcast, cache_dir):
+    stat = os.stat(zip_path)
+    key = repr((os.path.abspath(zip_path), stat.st_size, stat.st_mtime_ns, member,
+                sorted((schema or {}).items(), key=str), usecols, downcast))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(member))[0]
+    return os.path.join(cache_dir, f"{stem}-{digest}.parquet")
+
+
+def read_zipped_csv(zip_path, member, schema=None, usecols=None, downcast=True,
+                    chunksize=CHUNK_SIZE, cache_dir=None):
+    '''
+    Read one CSV member straight out of a zip archive, chunk by chunk, without
+    extracting it to disk.
+
+    `schema` maps column -> dtype and is applied while parsing; with `downcast`
+    any remaining float64 columns are stored as float32. When `cache_dir` is
+    given the result is persisted as Parquet on first read and served from
+    there afterwards (requires pyarrow; skipped with a warning otherwise).'''
+    if usecols is None and schema:
+        usecols = list(schema)
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = _cache_path(zip_path, member, schema, usecols, downcast, cache_dir)
+        if os.path.exists(cache_path):
+            return pd.read_parquet(cache_path)
+
+    chunks = []
+    with zipfile.ZipFile(zip_path) as zf, zf.open(member) as fh:
+        for chunk in pd.read_csv(fh, dtype=schema, usecols=usecols, chunksize=chunksize):
+            chunks.append(downcast_floats(chunk) if downcast else chunk)
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=usecols)
+
+    if cache_path is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+        except ImportError as e:
+            warnings.warn(f"Columnar cache disabled: {e}")
+    return df
@@ -0,0 +1,358 @@
+'''
+Replay Dash callback traffic against a Figure Friday app and report latency.
+
+    python -m figure_fridays.loadtest figure_fridays/week_21/loadtest.json --users 8 --iterations 5
+    python -m figure_fridays.loadtest figure_fridays/week_20/loadtest.json --gunicorn "-w 4 --threads 2"
+    python -m figure_fridays.loadtest capture.har --url http://127.0.0.1:8050 --users 4
+
+A scenario is a JSON file naming the app and a list of steps; each step sets
+component properties the way a user would ("state-dropdown.value": "TX") and
+the harness fires every server callback those properties feed, with the
+inputs and state taken from the app's layout and earlier responses
+(background callbacks are polled until they finish, or fail after --job-timeout). With "chain": true,
+outputs of a callback trigger the callbacks that read them, as in the
+browser. A .har file saved from the browser's network tab is replayed request
+by request instead.
+
+The app runs in-process (Flask test client, the default), under a gunicorn
+started on localhost (--gunicorn "<worker options>") or at --url. Nothing
+leaves the machine unless the app itself calls out. Each simulated user runs
+the scenario in its own thread; the report gives throughput and p50/p95/p99
+latency per callback.
+'''
+import argparse
+import http.client
+import importlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+
+UPDATE_PATH = '/_dash-update-component'
+MAX_CHAIN = 8
+BACKGROUND_POLL = 0.1  # seconds between polls of a background callback job
+BACKGROUND_TIMEOUT = 300.0  # a job still running after this long counts as failed (504)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))]
+
+
+def split_output(output):
+    '''(id, property) pairs of a callback's output string ("a.b" or "..a.b...c.d..").'''
+    parts = output[2:-2].split('...') if output.startswith('..') else [output]
+    return [tuple(part.rsplit('.', 1)) for part in parts]
+
+
+def collect_props(node, props):
+    '''Add the props of every component with a string id in a layout / children tree.'''
+    if isinstance(node, list):
+        for child in node:
+            collect_props(child, props)
+    elif isinstance(node, dict) and 'props' in node and 'type' in node:
+        component_props = node['props']
+        if isinstance(component_props.get('id'), str):
+            for prop, value in component_props.items():
+                props[f"{component_props['id']}.{prop}"] = value
+        for value in component_props.values():
+            collect_props(value, props)
+
+
+# Transports -----------------------------------------------------------------
+
+class InProcessClient:
+    def __init__(self, server):
+        self.client = server.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.data
+
+    def post(self, path, body):
+        response = self.client.post(path, data=body, content_type='application/json')
+        return response.status_code, response.data
+
+
+class HTTPClient:
+    '''One keep-alive connection per simulated user.'''
+
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=300)
+
+    def _request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            self.conn.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=300)
+            self.conn.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.conn.getresponse()
+        return response.status, response.read()
+
+    def get(self, path):
+        return self._request('GET', path)
+
+    def post(self, path, body):
+        return self._request('POST', path, body)
+
+
+def load_in_process(module, cwd):
+    os.chdir(cwd)
+    sys.path.insert(0, cwd)
+    app_module = importlib.import_module(module)
+    server = getattr(app_module, 'server', None) or app_module.app.server
+    return lambda: InProcessClient(server)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(module, cwd, options, timeout=120.0):
+    port = free_port()
+    command = ['gunicorn', '--chdir', cwd, '-b', f'127.0.0.1:{port}', *options.split(), f'{module}:app.server']
+    process = subprocess.Popen(command, env={**os.environ, 'PYTHONPATH': os.pathsep.join([cwd, os.getcwd()])})
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            HTTPClient(url).get('/_dash-dependencies')
+            return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def wait_until_ready(client, timeout=300.0):
+    '''Apps with /healthz/ready (see figure_fridays.lazy) are given time to warm up first.'''
+    status, body = client.get('/healthz')
+    if status != 200 or not body.lstrip().startswith(b'{'):
+        return
+    deadline = time.time() + timeout
+    while client.get('/healthz/ready')[0] != 200 and time.time() < deadline:
+        time.sleep(0.2)
+
+
+def post_callback(client, body, timeout=BACKGROUND_TIMEOUT):
+    '''
+    POST one callback request and return (status, payload). Background
+    callbacks answer with a job handle first; they are polled, as the
+    renderer does, until the result arrives. A job with no result after
+    `timeout` seconds (hung or lost) is reported as a 504.'''
+    status, data = client.post(UPDATE_PATH, body)
+    payload = json.loads(data) if status == 200 and data else {}
+    if 'cacheKey' not in payload:
+        return status, payload
+    query = urllib.parse.urlencode({'cacheKey': payload['cacheKey'], 'job': payload['job']})
+    deadline = time.monotonic() + timeout
+    while True:
+        if time.monotonic() >= deadline:
+            return 504, {}
+        time.sleep(BACKGROUND_POLL)
+        status, data = client.post(f'{UPDATE_PATH}?{query}', body)
+        payload = json.loads(data) if status == 200 and data else {}
+        if status != 200 or 'response' in payload:
+            return status, payload
+
+
+# Sessions -------------------------------------------------------------------
+
+class Session:
+    '''One simulated browser: current property values plus the callback graph.'''
+
+    def __init__(self, client, dependencies, layout, stats, chain=True, job_timeout=BACKGROUND_TIMEOUT):
+        self.client = client
+        self.stats = stats
+        self.chain = chain
+        self.job_timeout = job_timeout
+        self.callbacks = [dep for dep in dependencies if not dep.get('clientside_function')]
+        self.layout = layout
+        self.props = {}
+
+    def reset(self):
+        self.props = {}
+        collect_props(self.layout, self.props)
+
+    def _known(self, spec):
+        return spec['id'].startswith('{') or f"{spec['id']}.{spec['property']}" in self.props
+
+    def _values(self, specs):
+        values = []
+        for spec in specs:
+            if spec['id'].startswith('{'):
+                # Wildcard (ALL) dependency: no pattern-matched components are rendered
+                values.append([])
+            else:
+                values.append({**spec, 'value': self.props.get(f"{spec['id']}.{spec['property']}")})
+        return values
+
+    def fire(self, callback, changed):
+        outputs = [{'id': id_, 'property': prop} for id_, prop in split_output(callback['output'])]
+        body = json.dumps({
+            'output': callback['output'],
+            'outputs': outputs if callback['output'].startswith('..') else outputs[0],
+            'inputs': self._values(callback['inputs']),
+            'state': self._values(callback['state']),
+            'changedPropIds': sorted(changed),
+        })
+        start = time.perf_counter()
+        status, payload = post_callback(self.client, body, self.job_timeout)
+        self.stats.record(callback['output'], time.perf_counter() - start, status)
+        updated = set()
+        for id_, props in payload.get('response', {}).items():
+            for prop, value in props.items():
+                self.props[f'{id_}.{prop}'] = value
+                updated.add(f'{id_}.{prop}')
+                collect_props(value, self.props)
+        return updated
+
+    def triggered_by(self, changed):
+        return [cb for cb in self.callbacks
+                if any(f"{spec['id']}.{spec['property']}" in changed for spec in cb['inputs'])
+                and all(self._known(spec) for spec in cb['inputs'])]
+
+    def initial_load(self):
+        for callback in self.callbacks:
+            if not callback.get('prevent_initial_call') and all(self._known(s) for s in callback['inputs']):
+                self.fire(callback, set())
+
+    def step(self, values):
+        self.props.update(values)
+        changed = set(values)
+        for _ in range(MAX_CHAIN):
+            updated = set()
+            for callback in self.triggered_by(changed):
+                updated |= self.fire(callback, changed)
+            if not self.chain or not updated:
+                break
+            changed = updated
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, callback, seconds, status):
+        with self.lock:
+            self.latencies[callback].append(seconds)
+            if status >= 400:
+                self.errors[callback] += 1
+
+    def report(self, elapsed):
+        total = sum(len(values) for values in self.latencies.values())
+        lines = [f"{total} requests in {elapsed:.2f} s ({total / elapsed:.1f} req/s)", '',
+                 f"{'callback':<60}{'n':>6}{'err':>5}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"]
+        for callback, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            name = callback if len(callback) <= 58 else callback[:55] + '...'
+            lines.append(f"{name:<60}{len(values):>6}{self.errors[callback]:>5}{len(values) / elapsed:>8.1f}"
+                         + ''.join(f"{percentile(values, q) * 1e3:>9.1f}" for q in (50, 95, 99)))
+        return '\n'.join(lines)
+
+
+def har_requests(path):
+    '''Bodies of the callback requests recorded in a browser HAR file, in order.'''
+    with open(path) as fh:
+        entries = json.load(fh)['log']['entries']
+    return [entry['request']['postData']['text'] for entry in entries
+            if entry['request']['url'].split('?')[0].endswith(UPDATE_PATH) and entry['request'].get('postData')]
+
+
+def run(make_client, scenario, users, iterations, stats, job_timeout=BACKGROUND_TIMEOUT):
+    probe = make_client()
+    wait_until_ready(probe)
+    if scenario.get('har'):
+        bodies = har_requests(scenario['har'])
+
+        def user():
+            client = make_client()
+            for _ in range(iterations):
+                for body in bodies:
+                    start = time.perf_counter()
+                    status, _ = post_callback(client, body, job_timeout)
+                    stats.record(json.loads(body)['output'], time.perf_counter() - start, status)
+    else:
+        dependencies = json.loads(probe.get('/_dash-dependencies')[1])
+        layout = json.loads(probe.get('/_dash-layout')[1])
+
+        def user():
+            session = Session(make_client(), dependencies, layout, stats, chain=scenario.get('chain', True),
+                              job_timeout=job_timeout)
+            for _ in range(iterations):
+                session.reset()
+                if scenario.get('initial', True):
+                    session.initial_load()
+                for step in scenario['steps']:
+                    session.step(step['set'])
+
+    threads = [threading.Thread(target=user, name=f'user-{i}') for i in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenario', help="scenario .json or browser .har file")
+    parser.add_argument('--module', help="app module (overrides the scenario's)")
+    parser.add_argument('--cwd', help="directory the app runs from (overrides the scenario's)")
+    parser.add_argument('--url', help="replay against an app already running here")
+    parser.add_argument('--gunicorn', metavar='OPTIONS', help='start the app under gunicorn, e.g. "-w 4 --threads 2"')
+    parser.add_argument('--users', type=int, default=4, help="concurrent simulated users")
+    parser.add_argument('--iterations', type=int, default=3, help="scenario repetitions per user")
+    parser.add_argument('--job-timeout', type=float, default=BACKGROUND_TIMEOUT,
+                        help="seconds before an unfinished background callback counts as failed")
+    args = parser.parse_args(argv)
+
+    if args.scenario.endswith('.har'):
+        scenario = {'har': os.path.abspath(args.scenario)}
+    else:
+        with open(args.scenario) as fh:
+            scenario = json.load(fh)
+    module = args.module or scenario.get('module')
+    cwd = os.path.abspath(args.cwd or scenario.get('cwd', '.'))
+
+    process = None
+    if args.url:
+        make_client = lambda: HTTPClient(args.url)  # noqa: E731
+    elif args.gunicorn is not None:
+        process, url = start_gunicorn(module, cwd, args.gunicorn)
+        make_client = lambda: HTTPClient(url)  # noqa: E731
+    else:
+        make_client = load_in_process(module, cwd)
+
+    stats = Stats()
+    try:
+        elapsed = run(make_client, scenario, args.users, args.iterations, stats, args.job_timeout)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(stats.report(elapsed))
+    return 1 if any(stats.errors.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,336 @@
+'''
+Deep memory accounting for the objects a worker keeps alive between requests.
+
+Apps register their module-level datasets, models and caches by name:
+
+    from figure_fridays.memory import add_memory_route, register
+    register('df', lambda: df, owner=__name__)
+    add_memory_route(app.server)
+
+GET /_memory lists every registered object's deep size and its recent trend
+(objects that kept growing are flagged) against the process's resident set; /_memory?object=<name> adds the
+per-column breakdown and suggested dtype downcasts. The same data is available
+from report() and details(). Sizes are sampled in the background
+(start_sampling(), started by add_memory_route) at a fixed interval; reports
+read the latest sample, so they are cheap and growth is measured over time,
+not over how often someone looks.
+'''
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import flask
+import numpy as np
+
+HISTORY = 120
+# An object counts as growing when its last GROWTH_SAMPLES sizes never went down and rose by at least GROWTH_BYTES
+GROWTH_SAMPLES = 5
+GROWTH_BYTES = 1 * 2**20
+MAX_DEPTH = 6
+
+
+def rss():
+    '''Resident set size of this process in bytes.'''
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _is_frame(obj):
+    return hasattr(obj, 'memory_usage') and hasattr(obj, 'dtypes')
+
+
+def deep_size(obj, seen=None, depth=0):
+    '''
+    Bytes held by `obj` and what it references: pandas objects via
+    memory_usage(deep=True), arrays by their buffers (memory-mapped files
+    count as 0, they are paged in from disk), containers and plain objects
+    recursively. Shared objects are counted once.'''
+    seen = set() if seen is None else seen
+    if id(obj) in seen or depth > MAX_DEPTH:
+        return 0
+    seen.add(id(obj))
+
+    if _is_frame(obj):
+        usage = obj.memory_usage(deep=True, index=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if hasattr(obj, 'memory_usage') and hasattr(obj, 'dtype'):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.memmap):
+        return 0
+    if isinstance(obj, np.ndarray):
+        # Views share their base array's buffer, which is counted once
+        root = obj
+        while isinstance(root.base, np.ndarray):
+            root = root.base
+        if root is not obj:
+            if id(root) in seen:
+                return 0
+            seen.add(id(root))
+        size = root.nbytes
+        if root.dtype == object:
+            size += sum(deep_size(item, seen, depth + 1) for item in root.ravel())
+        return size
+    if type(obj).__name__ == 'Tree' and hasattr(obj, '__getstate__'):
+        # sklearn trees keep their nodes in C arrays, only visible through the pickle state
+        state = obj.__getstate__()
+        return sys.getsizeof(obj) + state['nodes'].nbytes + state['values'].nbytes
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(deep_size(key, seen, depth + 1) + deep_size(value, seen, depth + 1)
+                          for key, value in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset, deque)):
+        return size + sum(deep_size(item, seen, depth + 1) for item in obj)
+    if hasattr(obj, '__dict__') and not isinstance(obj, type) and not callable(obj):
+        return size + deep_size(vars(obj), seen, depth + 1)
+    if hasattr(obj, '__slots__'):
+        return size + sum(deep_size(getattr(obj, slot), seen, depth + 1)
+                          for slot in obj.__slots__ if hasattr(obj, slot))
+    return size
+
+
+def suggest_dtype(values):
+    '''
+    A smaller dtype holding the same values, or None: the narrowest integer
+    type for the range, float32 when every value keeps 6 significant digits,
+    category for text where values repeat at least twice on average.'''
+    values = np.asarray(values) if not hasattr(values, 'dtype') else values
+    kind = values.dtype.kind
+    if kind in 'iu' and len(values):
+        low, high = values.min(), values.max()
+        for dtype in ('int8', 'uint8', 'int16', 'uint16', 'int32', 'uint32'):
+            info = np.iinfo(dtype)
+            if info.bits < values.dtype.itemsize * 8 and info.min <= low and high <= info.max:
+                return dtype
+        return None
+    if kind == 'f' and values.dtype.itemsize > 4 and len(values):
+        data = np.asarray(values, dtype=np.float64)
+        narrowed = data.astype(np.float32).astype(np.float64)
+        if np.allclose(narrowed, data, rtol=1e-6, atol=0, equal_nan=True):
+            return 'float32'
+        return None
+    if kind in 'OSUT' or str(values.dtype) in ('str', 'string'):
+        if hasattr(values, 'nunique') and len(values) and values.nunique() <= len(values) // 2:
+            return 'category'
+    return None
+
+
+def _column_bytes(values):
+    if isinstance(values, np.ndarray):
+        return values.nbytes
+    if hasattr(values, 'index'):
+        return int(values.memory_usage(deep=True, index=False))
+    return int(values.memory_usage(deep=True))
+
+
+def columns(obj):
+    '''
+    Per-column bytes, dtype and suggested downcast of a DataFrame, or of the
+    arrays in a dict or in an object's attributes.'''
+    if hasattr(obj, '__dict__') and not _is_frame(obj) and not isinstance(obj, np.ndarray):
+        obj = vars(obj)
+    if _is_frame(obj):
+        items = [(str(col), obj[col]) for col in obj.columns]
+    elif isinstance(obj, dict):
+        items = [(str(key), value) for key, value in obj.items()
+                 if isinstance(value, np.ndarray) or (hasattr(value, 'dtype') and hasattr(value, 'memory_usage'))]
+    elif isinstance(obj, np.ndarray):
+        items = [('values', obj)]
+    else:
+        return []
+
+    rows = []
+    for name, values in items:
+        size = _column_bytes(values)
+        suggestion = suggest_dtype(values)
+        if suggestion == 'category':
+            saved = size - _column_bytes(values.astype('category'))
+        elif suggestion:
+            saved = size - len(values) * np.dtype(suggestion).itemsize
+        else:
+            saved = 0
+        rows.append({'column': name, 'dtype': str(values.dtype), 'bytes': size,
+                     'suggested_dtype': suggestion, 'saving_bytes': max(saved, 0)})
+    return sorted(rows, key=lambda row: row['bytes'], reverse=True)
+
+
+class Entry:
+    def __init__(self, name, getter, owner):
+        self.name = name
+        self.getter = getter
+        self.owner = owner
+        self.history = deque(maxlen=HISTORY)
+        self.type_name = None
+        self.error = None
+        self.errors = 0
+
+    def sample(self, now):
+        '''
+        Record the object's deep size and return it. A failing getter or walk
+        (e.g. a cache resized mid-walk) is recorded on the entry instead,
+        keeping the last good sample, and returns None.'''
+        try:
+            obj = self.getter()
+            size = 0 if obj is None else deep_size(obj)
+        except Exception as err:
+            self.error = repr(err)
+            self.errors += 1
+            return None
+        self.type_name = type(obj).__name__
+        self.error = None
+        self.history.append((now, size))
+        return size
+
+    @property
+    def size(self):
+        '''Bytes at the latest sample, None before the first.'''
+        return self.history[-1][1] if self.history else None
+
+    @property
+    def growing(self):
+        sizes = [size for _, size in list(self.history)[-GROWTH_SAMPLES:]]
+        return (len(sizes) == GROWTH_SAMPLES and all(a <= b for a, b in zip(sizes, sizes[1:]))
+                and sizes[-1] - sizes[0] >= GROWTH_BYTES)
+
+
+class MemoryRegistry:
+    '''Named objects to account for; each is read through a getter so reassigned globals are followed.'''
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+        self._sampler = None
+        self._wake = threading.Event()
+
+    def register(self, name, getter, owner=None):
+        if not callable(getter):
+            value = getter
+            getter = lambda: value  # noqa: E731
+        with self.lock:
+            self.entries[name] = Entry(name, getter, owner)
+        # New objects get their first sample without waiting out the interval
+        self._wake.set()
+
+    def unregister(self, name=None, owner=None):
+        '''Drop one entry, or every entry registered by `owner` (e.g. an unloaded module).'''
+        with self.lock:
+            for key in [key for key, entry in self.entries.items()
+                        if key == name or (owner is not None and entry.owner == owner)]:
+                del self.entries[key]
+
+    def _selected(self, owner):
+        with self.lock:
+            return [entry for entry in self.entries.values() if owner is None or entry.owner == owner]
+
+    def sample(self, owner=None):
+        '''Measure every entry and record it in its history; returns {name: bytes or None}. Run by the sampler.'''
+        now = time.time()
+        return {entry.name: entry.sample(now) for entry in self._selected(owner)}
+
+    def total(self, owner=None):
+        '''Bytes at the latest samples (entries not sampled yet count as 0).'''
+        return sum(entry.size or 0 for entry in self._selected(owner))
+
+    def report(self, owner=None):
+        '''The latest samples; nothing is measured here.'''
+        now = time.time()
+        objects = []
+        for entry in self._selected(owner):
+            size = entry.size
+            objects.append({
+                'name': entry.name,
+                'owner': entry.owner,
+                'type': entry.type_name,
+                'bytes': size,
+                'mb': None if size is None else round(size / 2**20, 2),
+                'change_bytes': None if size is None else size - entry.history[0][1],
+                'samples': len(entry.history),
+                'sampled_seconds_ago': None if size is None else round(now - entry.history[-1][0], 1),
+                'growing': entry.growing,
+                'error': entry.error,
+                'errors': entry.errors,
+            })
+        objects.sort(key=lambda row: row['bytes'] or 0, reverse=True)
+        total = sum(row['bytes'] or 0 for row in objects)
+        resident = rss()
+        return {
+            'time': now,
+            'rss_mb': round(resident / 2**20, 2),
+            'total_mb': round(total / 2**20, 2),
+            # Interpreter, imported libraries and anything not registered
+            'unaccounted_mb': round((resident - total) / 2**20, 2),
+            'growing': [row['name'] for row in objects if row['growing']],
+            'objects': objects,
+        }
+
+    def details(self, name):
+        '''One object measured now, with its column breakdown; its history is left to the sampler.'''
+        with self.lock:
+            entry = self.entries[name]
+        obj = entry.getter()
+        breakdown = columns(obj)
+        return {
+            'name': name,
+            'owner': entry.owner,
+            'type': type(obj).__name__,
+            'bytes': 0 if obj is None else deep_size(obj),
+            'columns': breakdown,
+            'possible_saving_bytes': sum(row['saving_bytes'] for row in breakdown),
+            'history': [{'time': when, 'bytes': size} for when, size in entry.history],
+        }
+
+    def start_sampling(self, interval=60.0):
+        '''
+        Sample now and then every `interval` seconds, in a daemon thread (once
+        per registry); registering an object triggers an extra sample.'''
+        if self._sampler is not None:
+            return self._sampler
+
+        def run():
+            while True:
+                self.sample()
+                self._wake.wait(interval)
+                self._wake.clear()
+
+        self._sampler = threading.Thread(target=run, name='memory-sampler', daemon=True)
+        self._sampler.start()
+        return self._sampler
+
+
+REGISTRY = MemoryRegistry()
+
+
+def register(name, getter, owner=None):
+    REGISTRY.register(name, getter, owner)
+
+
+def add_memory_route(server, registry=REGISTRY, path='/_memory', owner=None, local_only=True, sample_every=60.0):
+    '''
+    JSON report of `registry` (only `owner`'s entries when given) at `path`;
+    ?object=<name> for one object's columns, downcasts and history.
+    Local requests only unless local_only=False. Also starts the registry's
+    background sampling every `sample_every` seconds (None to leave sampling to
+    the caller, e.g. registry.sample() from a scheduler).'''
+    if sample_every:
+        registry.start_sampling(sample_every)
+
+    @server.route(path, endpoint=f'memory_report_{path}')
+    def memory_report():
+        if local_only and flask.request.remote_addr not in ('127.0.0.1', '::1', None):
+            flask.abort(404)
+        name = flask.request.args.get('object')
+        if name is None:
+            return flask.jsonify(registry.report(owner))
+        if name not in registry.entries:
+            flask.abort(404)
+        return flask.jsonify(registry.details(name))
+
+    return memory_report
@@ -0,0 +1,225 @@
+'''
+Smaller callback responses for the weekly apps.
+
+encode_arrays(fig) rewrites a figure's large numeric trace arrays as plotly.js
+typed arrays (base64 data with a dtype) instead of JSON number lists, narrowed
+to int8 ... uint32 or float32 where the values survive it. add_compression()
+gzips responses and keeps each callback's payload sizes: as plain JSON, with
+typed arrays, and on the wire.
+
+    from figure_fridays.payload import add_compression, encode_arrays
+    add_compression(app.server)
+    ...
+    return encode_arrays(fig)
+
+GET /_payload reports the sizes per callback.
+'''
+import base64
+import gzip
+import json
+import threading
+from collections import OrderedDict
+
+import flask
+import numpy as np
+
+from figure_fridays.memory import suggest_dtype
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Arrays with fewer numbers stay JSON lists; the base64 wrapper is not worth it
+TYPED_ARRAY_MIN = 256
+TYPED_DTYPES = {'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2', 'int32': 'i4', 'uint32': 'u4',
+                'float32': 'f4', 'float64': 'f8'}
+# Printed as-is by hover templates, so never narrowed
+EXACT_KEYS = ('customdata', 'text', 'hovertext')
+# Not trace data (plotly skips these too)
+SKIPPED_KEYS = ('geojson', 'layer', 'layers', 'range')
+
+COMPRESS_MIN = 1024
+COMPRESS_LEVEL = 6
+COMPRESSIBLE = ('application/json', 'application/javascript', 'text/')
+# Compressed static files (Dash's JS bundles) kept by path and ETag
+STATIC_CACHE_SIZE = 64
+STATIC_PATH = '_dash-component-suites'
+UPDATE_PATH = '_dash-update-component'
+
+
+def typed_array(values, narrow=True):
+    '''
+    plotly.js typed-array spec ({'dtype', 'bdata'[, 'shape']}) for a numeric
+    array, narrowed first when `narrow` and the values allow it (see
+    memory.suggest_dtype); None for arrays plotly.js has no type for (bools,
+    text, 64-bit integers beyond the uint32 range).'''
+    values = np.asarray(values)
+    if values.dtype.kind not in 'iuf' or not values.size:
+        return None
+    if narrow:
+        smaller = suggest_dtype(values.ravel())
+        if smaller is not None:
+            values = values.astype(smaller)
+    if values.dtype.kind == 'f' and values.dtype.name not in TYPED_DTYPES:
+        values = values.astype(np.float32 if values.dtype.itemsize < 4 else np.float64)
+    dtype = TYPED_DTYPES.get(values.dtype.name)
+    if dtype is None:
+        return None
+    data = np.ascontiguousarray(values).astype(values.dtype.newbyteorder('<'), copy=False)
+    spec = {'dtype': dtype, 'bdata': base64.b64encode(data).decode('ascii')}
+    if values.ndim > 1:
+        spec['shape'] = ', '.join(str(n) for n in values.shape)
+    return spec
+
+
+def _json_size(values):
+    if orjson is not None:
+        try:
+            return len(orjson.dumps(values, option=orjson.OPT_SERIALIZE_NUMPY))
+        except orjson.JSONEncodeError:
+            pass
+    return len(json.dumps(values.tolist()))
+
+
+def _spec_size(spec):
+    return sum(len(key) + len(value) + 6 for key, value in spec.items()) + 2
+
+
+def _encode(value, threshold, narrow, sizes):
+    if isinstance(value, dict):
+        return {key: item if key in SKIPPED_KEYS else _encode(item, threshold, narrow and key not in EXACT_KEYS, sizes)
+                for key, item in value.items()}
+    if isinstance(value, (np.ndarray, list, tuple)):
+        try:
+            array = np.asarray(value)
+        except ValueError:  # ragged nested lists are left as they are
+            return value
+        spec = typed_array(array, narrow) if array.size >= threshold and array.dtype.kind in 'iuf' else None
+        if spec is not None:
+            if sizes is not None:
+                sizes[0] += _json_size(array)
+                sizes[1] += _spec_size(spec)
+            return spec
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        return [_encode(item, threshold, narrow, sizes) for item in value]
+    return value
+
+
+def encode_arrays(fig, threshold=TYPED_ARRAY_MIN):
+    '''
+    `fig` (a figure dict or go.Figure) as a figure dict whose trace arrays of at
+    least `threshold` numbers are typed arrays. The layout is passed through
+    as it is; the input figure is not modified.'''
+    if hasattr(fig, 'to_dict'):
+        # Trace props as given, before plotly's own (float64) encoding
+        fig = {'data': [trace.to_plotly_json() for trace in fig.data], 'layout': fig.layout.to_plotly_json()}
+    # Sizes are only measured while add_compression() records this request
+    sizes = flask.g.get('payload_arrays') if flask.has_request_context() else None
+    return {**fig, 'data': [_encode(trace, threshold, True, sizes) for trace in fig.get('data', [])]}
+
+
+class PayloadStats:
+    '''Per-callback totals: calls, bytes as plain JSON, bytes with typed arrays, bytes sent.'''
+
+    def __init__(self):
+        self.callbacks = {}
+        self.lock = threading.Lock()
+
+    def record(self, callback, plain, response, sent):
+        with self.lock:
+            totals = self.callbacks.setdefault(callback, [0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += plain
+            totals[2] += response
+            totals[3] += sent
+
+    def report(self):
+        with self.lock:
+            items = [(name, list(totals)) for name, totals in self.callbacks.items()]
+        rows = []
+        for name, (calls, plain, response, sent) in items:
+            rows.append({
+                'callback': name,
+                'calls': calls,
+                'plain_json_bytes': plain,
+                'response_bytes': response,
+                'sent_bytes': sent,
+                'avg_sent_bytes': round(sent / calls),
+                # Share of the plain JSON size saved by typed arrays, then by compression
+                'typed_array_saving': round(1 - response / plain, 3) if plain else 0,
+                'total_saving': round(1 - sent / plain, 3) if plain else 0,
+            })
+        return sorted(rows, key=lambda row: row['plain_json_bytes'], reverse=True)
+
+
+def _callback_name():
+    body = flask.request.get_json(silent=True) or {}
+    return body.get('output', 'unknown')
+
+
+def add_compression(server, path='/_payload', level=COMPRESS_LEVEL, min_size=COMPRESS_MIN, local_only=True):
+    '''
+    Gzip text and JSON responses of at least `min_size` bytes for clients that
+    accept it (streamed responses, such as file exports, are left alone), and
+    record each callback's payload sizes, reported as JSON at `path` (local
+    requests only unless local_only=False).'''
+    stats = PayloadStats()
+    static = OrderedDict()
+    static_lock = threading.Lock()
+
+    @server.before_request
+    def measure_arrays():
+        if flask.request.path.endswith(UPDATE_PATH):
+            flask.g.payload_arrays = [0, 0]
+
+    def gzipped(response, body):
+        # Fingerprinted component bundles and ETagged files are compressed once
+        etag, _ = response.get_etag()
+        if etag is None and STATIC_PATH not in flask.request.path:
+            return gzip.compress(body, level)
+        key = (flask.request.path, etag)
+        with static_lock:
+            if key in static:
+                static.move_to_end(key)
+                return static[key]
+        data = gzip.compress(body, level)
+        with static_lock:
+            static[key] = data
+            while len(static) > STATIC_CACHE_SIZE:
+                static.popitem(last=False)
+        return data
+
+    @server.after_request
+    def compress(response):
+        arrays = flask.g.pop('payload_arrays', None)
+        if response.direct_passthrough or response.is_streamed:
+            return response
+        body = response.get_data()
+        sent = len(body)
+        if (sent >= min_size and response.status_code == 200 and 'Content-Encoding' not in response.headers
+                and (response.mimetype or '').startswith(COMPRESSIBLE) and flask.request.accept_encodings['gzip']):
+            response.vary.add('Accept-Encoding')
+            etag, weak = response.get_etag()
+            if etag is not None:
+                # The gzipped bytes get their own strong ETag; Dash only knows the plain
+                # one, so revalidation of the gzipped variant is answered here
+                response.set_etag(f'{etag}-gzip', weak)
+                response.make_conditional(flask.request)
+                if response.status_code == 304:
+                    return response
+            data = gzipped(response, body)
+            response.set_data(data)
+            response.headers['Content-Encoding'] = 'gzip'
+            sent = len(data)
+        if arrays is not None:
+            stats.record(_callback_name(), len(body) - arrays[1] + arrays[0], len(body), sent)
+        return response
+
+    @server.route(path, endpoint=f'payload_report_{path}')
+    def payload_report():
+        if local_only and flask.request.remote_addr not in ('127.0.0.1', '::1', None):
+            flask.abort(404)
+        return flask.jsonify(stats.report())
+
+    return stats
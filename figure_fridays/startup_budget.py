@@ -0,0 +1,101 @@
+'''
+Import-time and cold-start measurements for a Dash app's entry module.
+
+Each measurement runs in a fresh interpreter so nothing is already imported:
+
+    python -m figure_fridays.startup_budget figure_fridays.week_21.app.main
+    python -m figure_fridays.startup_budget figure_fridays.week_20.main --budget 2.5
+
+Reports the most expensive imported packages (from -X importtime), the time
+to import the module, to serve the first page and layout, and, for apps
+exposing /healthz/ready, the time until every lazy resource is warm. With --budget the
+exit status is 1 when importing the module takes longer than that many seconds.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+COLD_START = r'''
+import importlib, json, sys, time
+start = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+server = getattr(module, "server", None) or module.app.server
+client = server.test_client()
+timings = {"import": imported - start}
+page = client.get("/")
+timings["first_page"] = time.perf_counter() - imported
+layout = client.get("/_dash-layout")
+timings["first_layout"] = time.perf_counter() - imported
+timings["status"] = [page.status_code, layout.status_code]
+deadline = float(sys.argv[2])
+if client.get("/healthz").is_json:
+    while client.get("/healthz/ready").status_code != 200 and time.perf_counter() - imported < deadline:
+        time.sleep(0.05)
+    timings["ready"] = time.perf_counter() - imported
+    timings["health"] = client.get("/healthz").get_json()
+print(json.dumps(timings))
+'''
+
+
+def import_times(module, cwd, top=15):
+    '''
+    (cumulative seconds, package) for the most expensive third-party packages
+    pulled in by `module`, from -X importtime; each package counts once, at its
+    most expensive import.'''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    own = module.split('.')[0]
+    costs = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        if package != own:
+            costs[package] = max(costs.get(package, 0), int(cumulative) / 1e6)
+    return sorted(((seconds, package) for package, seconds in costs.items()), reverse=True)[:top]
+
+
+def cold_start(module, cwd, timeout=120.0):
+    result = subprocess.run([sys.executable, '-c', COLD_START, module, str(timeout)],
+                            cwd=cwd, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('module', help="entry module, e.g. figure_fridays.week_21.app.main")
+    parser.add_argument('--cwd', default='.', help="directory the app is normally started from")
+    parser.add_argument('--top', type=int, default=15, help="number of packages to list")
+    parser.add_argument('--budget', type=float, help="fail if importing the module takes longer (s)")
+    parser.add_argument('--timeout', type=float, default=120.0, help="max seconds to wait for readiness")
+    args = parser.parse_args(argv)
+    cwd = os.path.abspath(args.cwd)
+
+    print(f"Most expensive imports for {args.module}:")
+    for seconds, name in import_times(args.module, cwd, args.top):
+        print(f"  {seconds * 1e3:9.1f} ms  {name}")
+
+    timings = cold_start(args.module, cwd, args.timeout)
+    print("Cold start:")
+    for key in ('import', 'first_page', 'first_layout', 'ready'):
+        if key in timings:
+            print(f"  {key:<13}{timings[key]:8.3f} s")
+    if 'health' in timings:
+        print(f"  health       {json.dumps(timings['health']['resources'])}")
+
+    if args.budget is not None and timings['import'] > args.budget:
+        print(f"Import took {timings['import']:.3f} s, over the {args.budget:.3f} s budget.")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,6 @@
+import pandas as pd
+
+
 def summary_metrics(df):
     '''
     acceptance rate, rejection rate, pending application and total applications'''
@@ -26,3 +29,51 @@ def summary_metrics(df):
         'incomplete_applications': incomplete_cnt,
         'under_review': review_cnt
     }
+
+
+def week_start(dates):
+    '''Sunday starting the week of each date; %U weeks too, except that %U splits the week spanning New Year'''
+    dates = pd.to_datetime(dates).dt.normalize()
+    return dates - pd.to_timedelta((dates.dt.dayofweek + 1) % 7, unit='D')
+
+
+class WeeklyRollup:
+    '''
+    Applications per week and status, grouped once at load. add() folds in new
+    applications, or new statuses of known ones, by adjusting only the affected
+    counts, so trend views read this small table instead of the raw rows.'''
+
+    def __init__(self, df):
+        self.counts = pd.DataFrame(dtype='int64')
+        # Week and current status of every application seen so far, to move it when its status changes
+        self.latest = pd.DataFrame({'Week': pd.Series(dtype='datetime64[ns]'), 'Status': pd.Series(dtype=object)})
+        self.add(df)
+
+    def add(self, rows):
+        rows = rows.drop_duplicates('App No', keep='last')
+        new = pd.DataFrame({'Week': week_start(rows['App Date']).to_numpy(), 'Status': rows['Status'].to_numpy()},
+                           index=rows['App No'].to_numpy())
+        old = self.latest[self.latest.index.isin(new.index)]
+
+        delta = new.groupby(['Week', 'Status']).size().sub(old.groupby(['Week', 'Status']).size(), fill_value=0)
+        counts = self.counts.add(delta.unstack(fill_value=0), fill_value=0).fillna(0).astype('int64')
+        self.counts = counts.loc[:, (counts != 0).any()].sort_index()
+        self.latest = pd.concat([self.latest[~self.latest.index.isin(new.index)], new])
+        return self
+
+    def trend(self, window=4, start=None, end=None):
+        '''
+        Weekly counts per status (missing weeks as 0), plus rolling acceptance and
+        rejection rates in % over the last `window` weeks, as in summary_metrics.'''
+        if self.counts.empty:
+            return pd.DataFrame()
+        weeks = pd.date_range(self.counts.index.min(), self.counts.index.max(), freq='7D')
+        counts = self.counts.reindex(weeks, fill_value=0)
+        counts.index.name = 'Week'
+
+        total = counts.sum(axis=1).rolling(window, min_periods=1).sum()
+        trend = counts.copy()
+        for label, status in [('Acceptance Rate', 'Approved - License Issued'), ('Rejection Rate', 'Denied')]:
+            status_counts = counts.get(status, pd.Series(0, index=counts.index))
+            trend[label] = (status_counts.rolling(window, min_periods=1).sum() / total * 100).fillna(0).round(2)
+        return trend.loc[start:end]
@@ -1,10 +1,19 @@
+import os
+
 from dash import Dash, dcc, html, Input, Output
 import dash_bootstrap_components as dbc
 import dash_ag_grid as dag
-import plotly.express as px
+import numpy as np
 import pandas as pd
 
-from helpers import summary_metrics  # Import from your helpers.py
+from figure_fridays.week_19.helpers import WeeklyRollup, summary_metrics  # Import from your helpers.py
+from figure_fridays.fastfig import enable_fast_json, figure, px_bars, px_layout, scatter
+from figure_fridays.memory import add_memory_route, register
+from figure_fridays.payload import add_compression, encode_arrays
+
+enable_fast_json()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
 
 # Theme dictionary
 THEMES = {
@@ -13,17 +22,27 @@ THEMES = {
 }
 
 # Load and preprocess data
-df = pd.read_csv("dataset/TLC_New_Driver_Application.csv") 
+df = pd.read_csv(os.path.join(HERE, "dataset", "TLC_New_Driver_Application.csv"))
 df['App Date'] = pd.to_datetime(df['App Date'])
 df['Month'] = df['App Date'].dt.strftime("%B %Y")
 df['Week'] = df['App Date'].dt.strftime("%U-%Y")
 df['Week_label'] = 'Week' + df['App Date'].dt.strftime("%U, %Y")
 
+# Weekly counts per status, grouped once here; weekly.add(new_rows) keeps them current
+weekly = WeeklyRollup(df)
+
+# Memory accounting (/_memory)
+register('week_19.df', lambda: df, owner=__name__)
+register('week_19.weekly.counts', lambda: weekly.counts, owner=__name__)
+register('week_19.weekly.latest', lambda: weekly.latest, owner=__name__)
+
 # Dropdown options
 month_options = [{'label': m, 'value': m} for m in df['Month'].unique()]
 
 # Initialize app
 app = Dash(__name__, external_stylesheets=[dbc.themes.CYBORG])  # default to dark mode
+add_memory_route(app.server, owner=__name__)
+add_compression(app.server)
 
 # Layout
 app.layout = html.Div([
@@ -57,6 +76,18 @@ app.layout = html.Div([
 
         html.Hr(),
 
+        html.H4("Weekly Trend", className="mt-3 text-info"),
+        dbc.Label("Rolling window for rates: ", className="text-light"),
+        dbc.RadioItems(
+            id='trend-window',
+            options=[{"label": f"{w} weeks", "value": w} for w in (4, 8, 12)],
+            value=4,
+            inline=True
+        ),
+        dcc.Graph(id='weekly-trend-graph', className="mt-2"),
+
+        html.Hr(),
+
         html.H4("Applications Table", className="mt-3 text-info"),
         html.Div(id='filtered-table')  # Table inserted dynamically
     ], fluid=True)
@@ -85,16 +116,13 @@ def update_dashboard(selected_month):
         html.P(f"📊 Total Applications: {metrics['total_applications']}"),
     ])
 
-    # Create filtered bar chart
-    filtered_counts = df_month.groupby(['Month', 'Status']).size().reset_index(name='Count')
-    fig = px.bar(
-        filtered_counts,
-        x='Month',
-        y='Count',
-        color='Status',
-        title=f'Status Counts for {selected_month}',
-        labels={'Count': 'Number of Applications', 'Month': 'Month', 'Status': 'Application Status'},
-        barmode='group'
+    # Create filtered bar chart (one bar per status, statuses in sorted order as groupby gives them)
+    status_counts = df_month['Status'].value_counts().sort_index()
+    fig = figure(
+        px_bars([selected_month] * len(status_counts), status_counts.to_numpy(), 'Month', 'Number of Applications',
+                color=('Application Status', status_counts.index)),
+        px_layout(f'Status Counts for {selected_month}', 'Month', 'Number of Applications', 'Application Status',
+                  barmode='group')
     )
 
     # Filtered AgGrid table
@@ -105,7 +133,32 @@ def update_dashboard(selected_month):
         columnSize="sizeToFit"
     )
 
-    return summary, fig, table
+    return summary, encode_arrays(fig), table
+
+# Callback for the weekly trend, drawn from the weekly rollup rather than the raw rows
+@app.callback(
+    Output('weekly-trend-graph', 'figure'),
+    Input('trend-window', 'value')
+)
+def update_weekly_trend(window):
+    trend = weekly.trend(window)
+    statuses = list(weekly.counts.columns)
+    weeks = trend.index.to_numpy()
+
+    # Stacked weekly counts by status, rolling rates on a second axis
+    traces = px_bars(np.tile(weeks, len(statuses)), trend[statuses].to_numpy().T.ravel(),
+                     'Week', 'Number of Applications', color=('Application Status', np.repeat(statuses, len(weeks))))
+    for label, color in [('Acceptance Rate', '#2ca02c'), ('Rejection Rate', '#d62728')]:
+        traces.append(scatter(weeks, trend[label].to_numpy(), mode='lines', name=f'{label} ({window}-week, %)',
+                              yaxis='y2', line={'color': color, 'width': 3},
+                              hovertemplate=f'Week of %{{x|%d %b %Y}}<br>{label}: %{{y:.2f}}%<extra></extra>'))
+
+    return encode_arrays(figure(traces, px_layout(
+        'Weekly Applications by Status', 'Week', 'Number of Applications', 'Application Status',
+        barmode='stack',
+        yaxis2={'title': {'text': 'Rate (%)'}, 'overlaying': 'y', 'side': 'right', 'range': [0, 100],
+                'showgrid': False}
+    )))
 
 # Run the app
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+'''
+Height/state index over the dams table, shared by the Dam Filter list and the
+export route, plus chunked CSV/Parquet writers for streaming a selection.
+'''
+import io
+
+import numpy as np
+from pandas.api.types import is_numeric_dtype
+
+EXPORT_CHUNK_ROWS = 5000
+
+
+class DamIndex:
+    '''
+    Dam heights sorted once (overall and per state), so a height range is two
+    binary searches instead of a scan of the table. Selections keep the
+    table's original row order; dams without a height never match.'''
+
+    def __init__(self, df, height_col='Dam Height (Ft)', state_col='State'):
+        self.df = df
+        heights = df[height_col].to_numpy(dtype=float)
+        valid = np.flatnonzero(~np.isnan(heights))
+        order = valid[np.argsort(heights[valid], kind='stable')]
+        self.heights = heights[order]
+        self.order = order
+        self.by_state = {}
+        states = df[state_col].to_numpy()[order]
+        for state in df[state_col].dropna().unique():
+            in_state = np.flatnonzero(states == state)
+            self.by_state[state] = (self.heights[in_state], order[in_state])
+        self.min_height = self.heights[0] if len(self.heights) else np.nan
+        self.max_height = self.heights[-1] if len(self.heights) else np.nan
+
+    def rows(self, min_h, max_h, state=None):
+        '''Positions (into df) of dams with min_h <= height <= max_h, optionally in one state.'''
+        heights, order = self.by_state.get(state, ((), ())) if state else (self.heights, self.order)
+        lo = np.searchsorted(heights, min_h, side='left')
+        hi = np.searchsorted(heights, max_h, side='right')
+        return np.sort(np.asarray(order[lo:hi], dtype=np.intp))
+
+    def select(self, min_h, max_h, state=None):
+        return self.df.iloc[self.rows(min_h, max_h, state)]
+
+    def chunks(self, min_h, max_h, state=None, size=EXPORT_CHUNK_ROWS):
+        '''The selection as DataFrames of at most `size` rows, built one at a time.'''
+        rows = self.rows(min_h, max_h, state)
+        for start in range(0, len(rows), size):
+            yield self.df.iloc[rows[start:start + size]]
+
+
+def csv_chunks(chunks):
+    '''Encoded CSV text, one piece per chunk; the header goes out with the first.'''
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header).encode('utf-8')
+        header = False
+
+
+def parquet_chunks(chunks, columns):
+    '''
+    A Parquet file, one row group per chunk; each group's bytes are handed
+    out as soon as they are written. `columns` is the table's dtypes
+    (df.dtypes). Needs pyarrow.'''
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = io.BytesIO()
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    # Fixed up front, so a chunk whose text column happens to be all empty still matches
+    schema = pa.schema([
+        (name, pa.from_numpy_dtype(dtype) if is_numeric_dtype(dtype) else pa.string())
+        for name, dtype in columns.items()
+    ])
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk[list(schema.names)], schema=schema, preserve_index=False))
+            yield drain()
+    yield drain()
@@ -1,7 +1,22 @@
+from collections import OrderedDict
 from openai import OpenAI
 import os
+import threading
+# Declared in requirements.txt (pip install ./tutorial_hands_on); the same breaker the callback plugin uses
+from callback_circuit_breaker_plugin import CircuitBreaker, CircuitOpenError
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Stop calling OpenAI while it keeps failing; one trial lookup per timeout checks whether it answers again
+chatgpt_breaker = CircuitBreaker("chatgpt")
+
+# Last good answer per lookup, served while the API is failing or the circuit is open
+ANSWER_CACHE_SIZE = 256
+last_answers = OrderedDict()
+last_answers_lock = threading.Lock()
+
+def last_answer(key):
+    with last_answers_lock:
+        return last_answers.get(key)
 
 def get_chatgpt_info(dam_name, state, missing_fields):
     prompt = f"""
@@ -11,11 +26,20 @@ The following information is missing: {', '.join(missing_fields)}.
 
 Please provide only the requested information in a clean, readable format (e.g. bullet list or JSON).
 """
+    key = (dam_name, state, tuple(missing_fields))
 
     try:
-        response = client.chat.completions.create(model="gpt-4",
+        response = chatgpt_breaker.call(client.chat.completions.create, model="gpt-4",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3)
-        return response.choices[0].message.content
+    except CircuitOpenError:
+        return last_answer(key) or "Error fetching data from ChatGPT: the service keeps failing, try again in a minute."
     except Exception as e:
-        return f"Error fetching data from ChatGPT: {e}"
+        return last_answer(key) or f"Error fetching data from ChatGPT: {e}"
+    answer = response.choices[0].message.content
+    with last_answers_lock:
+        last_answers[key] = answer
+        last_answers.move_to_end(key)
+        while len(last_answers) > ANSWER_CACHE_SIZE:
+            last_answers.popitem(last=False)
+    return answer
@@ -1,18 +1,52 @@
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
 import dash
 from dash import dcc, html, Input, Output, State
+import flask
 import pandas as pd
-import plotly.express as px
+from plotly.colors import qualitative
 import dash_bootstrap_components as dbc
 from dash.dependencies import ALL
-from helper import get_chatgpt_info
+from dash.exceptions import PreventUpdate
+from figure_fridays.week_20.helper import get_chatgpt_info
+from figure_fridays.week_20.dams import DamIndex, csv_chunks, parquet_chunks
+from figure_fridays.fastfig import enable_fast_json, figure, groups, hover, px_layout, scattergeo
+from figure_fridays.memory import add_memory_route, register
+from figure_fridays.payload import add_compression, encode_arrays
+
+enable_fast_json()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
 
 # Load data
-df = pd.read_csv('../datasets_all/nation-dams.csv')
+df = pd.read_csv(os.path.join(HERE, '..', 'datasets_all', 'nation-dams.csv'))
 df['Dam Height (Ft)'] = pd.to_numeric(df['Dam Height (Ft)'], errors='coerce')
+dam_index = DamIndex(df)
+
+# Static stats, computed once: slider bounds and state options
+HEIGHT_MIN = int(df['Dam Height (Ft)'].min())
+HEIGHT_MAX = int(df['Dam Height (Ft)'].max())
+STATE_OPTIONS = [{'label': s, 'value': s} for s in sorted(df['State'].dropna().unique())]
+
+# Dam details panels by dam name, least recently used dropped first
+DETAIL_CACHE_SIZE = 256
+detail_cache = OrderedDict()
+detail_cache_lock = threading.Lock()
+
+# Memory accounting (/_memory)
+register('week_20.df', lambda: df, owner=__name__)
+register('week_20.detail_cache', lambda: detail_cache, owner=__name__)
+register('week_20.dam_index', lambda: {'heights': dam_index.heights, 'order': dam_index.order,
+                                       'by_state': dam_index.by_state}, owner=__name__)
 
 # Initialize app
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.DARKLY], suppress_callback_exceptions=True)
 app.title = "US Dams Explorer"
+add_memory_route(app.server, owner=__name__)
+add_compression(app.server)
 
 # Layout
 app.layout = dbc.Container([
@@ -32,6 +66,8 @@ app.layout = dbc.Container([
         }
     ),
     dcc.Store(id='selected-dam-store'),
+    dcc.Store(id='detail-rendered-dam'),
+    dcc.Store(id='filter-tab-rendered', data=False),
 
     # Keep all tab content in the DOM; toggle visibility with CSS
     html.Div([
@@ -39,7 +75,7 @@ app.layout = dbc.Container([
         html.Div(id='tab-map-content', children=[
             dcc.Dropdown(
                 id='state-dropdown',
-                options=[{'label': s, 'value': s} for s in sorted(df['State'].dropna().unique())],
+                options=STATE_OPTIONS,
                 placeholder="Select a state",
                 style={'backgroundColor': '#2c2c2c', 'color': '#fff', 'margin': '10px auto'}
             ),
@@ -73,22 +109,20 @@ app.layout = dbc.Container([
 ], fluid=True, style={'backgroundColor': '#121212', 'minHeight': '100vh', 'color': '#ffffff'})
 
 
-# Callback: Show/Hide tab content divs
-@app.callback(
+# Callback: Show/Hide tab content divs (runs in the browser, no server round trip)
+app.clientside_callback(
+    """
+    function toggle_tab_content(tab) {
+        return ['tab-map', 'tab-detail', 'tab-filter'].map(
+            value => ({'display': value === tab ? 'block' : 'none'})
+        );
+    }
+    """,
     Output('tab-map-content', 'style'),
     Output('tab-detail-content', 'style'),
     Output('tab-filter-content', 'style'),
     Input('tabs', 'value')
 )
-def toggle_tab_content(tab):
-    styles = {'display': 'none'}
-    if tab == 'tab-map':
-        return {'display': 'block'}, styles, styles
-    elif tab == 'tab-detail':
-        return styles, {'display': 'block'}, styles
-    elif tab == 'tab-filter':
-        return styles, styles, {'display': 'block'}
-    return styles, styles, styles
 
 
 # Callback: Update map and dam count
@@ -109,19 +143,23 @@ def update_map(selected_state):
         }
         zoom = 3
 
-    fig = px.scatter_geo(
-        filtered_df,
-        lat='Latitude',
-        lon='Longitude',
-        color='State',
-        hover_name='Dam Name',
-        scope='usa',
-        title=f"Dams in {selected_state or 'the United States'}",
-        color_discrete_sequence=px.colors.qualitative.Dark2
-    )
-    fig.update_geos(
+    lat = filtered_df['Latitude'].to_numpy()
+    lon = filtered_df['Longitude'].to_numpy()
+    names = filtered_df['Dam Name'].to_numpy()
+    traces = []
+    for group in groups(len(filtered_df), color=('State', filtered_df['State']), colors=qualitative.Dark2):
+        idx = group['index']
+        traces.append(scattergeo(
+            lat[idx], lon[idx], hovertext=names[idx], geo='geo', mode='markers',
+            name=group['name'], legendgroup=group['name'], showlegend=True,
+            marker={'color': group['color'], 'symbol': 'circle'},
+            hovertemplate=hover(*group['fields'], ('Latitude', '%{lat}'), ('Longitude', '%{lon}'), name=True)
+        ))
+
+    geo = dict(
+        domain={'x': [0.0, 1.0], 'y': [0.0, 1.0]},
         scope="usa",
-        projection_type="albers usa",
+        projection={'type': "albers usa", 'scale': zoom},
         showland=True,
         landcolor="#1a1a1a",
         showocean=True,
@@ -132,49 +170,26 @@ def update_map(selected_state):
         rivercolor="#1e90ff",
         showcountries=True,
         countrycolor="white",
-        center=center,
-        projection_scale=zoom
+        center={'lat': float(center['lat']), 'lon': float(center['lon'])}
     )
-    fig.update_layout(
-        template='plotly_dark',
-        geo=dict(center=center, projection_scale=zoom),
+    fig = figure(traces, px_layout(
+        title=f"Dams in {selected_state or 'the United States'}",
+        legend_title='State',
+        geo=geo,
         showlegend=False,
         margin={"r": 0, "t": 40, "l": 0, "b": 0}
-    )
-
-    return fig, f"Total dams: {len(filtered_df)}"
-
-
-# Callback: Show dam details
-@app.callback(
-    Output('tab-detail-content', 'children'),
-    Input('tabs', 'value'),
-    Input('dam-map', 'clickData'),
-    Input('selected-dam-store', 'data')
-)
-def render_dam_details(tab, click_data, stored_dam_name):
-    if tab != 'tab-detail':
-        return html.Div("Select a dam on the map or from the list to see details here.",
-                        style={'textAlign': 'center', 'marginTop': '20px', 'color': '#ffffff'})
+    ), template='plotly_dark')
 
-    dam_name = None
-    if click_data:
-        dam_name = click_data['points'][0].get('hovertext') or click_data['points'][0].get('text')
-    elif stored_dam_name:
-        dam_name = stored_dam_name
+    return encode_arrays(fig), f"Total dams: {len(filtered_df)}"
 
-    if not dam_name:
-        return html.Div([
-            html.P("No dam selected.", style={'textAlign': 'center', 'marginTop': '20px', 'color': '#ffffff'}),
-            html.Br(),
-            html.Button("Get Latest Info via ChatGPT", id='chatgpt-fetch-button', n_clicks=0,
-                        style={'marginTop': '15px', 'backgroundColor': '#00baff', 'color': 'white', 'border': 'none', 'padding': '10px'}),
-            html.Div(id='chatgpt-response', style={'marginTop': '20px', 'whiteSpace': 'pre-wrap'})
-        ])
 
+def build_dam_details(dam_name):
+    '''
+    Details panel for one dam, and whether it may be reused (not when the
+    ChatGPT lookup failed, so the next visit retries it).'''
     selected = df[df['Dam Name'] == dam_name]
     if selected.empty:
-        return html.Div("Dam not found.", style={'textAlign': 'center', 'marginTop': '20px'})
+        return html.Div("Dam not found.", style={'textAlign': 'center', 'marginTop': '20px'}), True
 
     dam = selected.iloc[0]
 
@@ -230,7 +245,8 @@ def render_dam_details(tab, click_data, stored_dam_name):
         chatgpt_response = get_chatgpt_info(dam['Dam Name'], dam['State'], missing_fields)
         return html.Div([dam_info,
                          html.H3("Supplemented Info via ChatGPT:", style={'color': '#00baff'}),
-                         html.Pre(chatgpt_response, style={'whiteSpace': 'pre-wrap'})])
+                         html.Pre(chatgpt_response, style={'whiteSpace': 'pre-wrap'})]), \
+            not chatgpt_response.startswith("Error fetching data")
 
     # Otherwise, still return dam info + ChatGPT button
     return html.Div([
@@ -239,42 +255,85 @@ def render_dam_details(tab, click_data, stored_dam_name):
         html.Button("Get Latest Info via ChatGPT", id='chatgpt-fetch-button', n_clicks=0,
                     style={'marginTop': '15px', 'backgroundColor': '#00baff', 'color': 'white', 'border': 'none', 'padding': '10px'}),
         html.Div(id='chatgpt-response', style={'marginTop': '20px', 'whiteSpace': 'pre-wrap'})
-    ])
+    ]), True
+
 
+def dam_details(dam_name):
+    '''Memoized build_dam_details: each dam's panel, ChatGPT lookup included, is built once.'''
+    with detail_cache_lock:
+        if dam_name in detail_cache:
+            detail_cache.move_to_end(dam_name)
+            return detail_cache[dam_name]
+    panel, reusable = build_dam_details(dam_name)
+    if reusable:
+        with detail_cache_lock:
+            detail_cache[dam_name] = panel
+            while len(detail_cache) > DETAIL_CACHE_SIZE:
+                detail_cache.popitem(last=False)
+    return panel
 
 
-# Callback: Render Dam Filter tab content (slider + state dropdown + count)
+# Callback: Show dam details, only while the tab is shown and only when the selected dam changed
 @app.callback(
-    Output('tab-filter-content', 'children'),
-    Input('tabs', 'value')
+    Output('tab-detail-content', 'children'),
+    Output('detail-rendered-dam', 'data'),
+    Input('tabs', 'value'),
+    Input('selected-dam-store', 'data'),
+    State('detail-rendered-dam', 'data')
 )
-def render_filter_tab(tab):
-    if tab == 'tab-filter':
-        min_height = int(df['Dam Height (Ft)'].min())
-        max_height = int(df['Dam Height (Ft)'].max())
+def render_dam_details(tab, dam_name, rendered_dam):
+    if tab != 'tab-detail' or (dam_name is not None and dam_name == rendered_dam):
+        raise PreventUpdate
 
+    if not dam_name:
         return html.Div([
-            html.H3("Filter Dams by Height (Ft) and State"),
-            dcc.RangeSlider(
-                id='height-slider',
-                min=min_height,
-                max=max_height,
-                step=1,
-                value=[min_height, max_height],
-                marks={min_height: str(min_height), max_height: str(max_height)},
-                tooltip={"placement": "bottom", "always_visible": True}
-            ),
-            dcc.Dropdown(
-                id='filter-state-dropdown',
-                options=[{'label': s, 'value': s} for s in sorted(df['State'].dropna().unique())],
-                placeholder="Select a state (optional)",
-                clearable=True,
-                style={'backgroundColor': '#2c2c2c', 'color': '#fff', 'marginTop': '20px'}
-            ),
-            html.Div(id='filtered-dam-list', style={'marginTop': '20px', 'maxHeight': '400px', 'overflowY': 'auto'}),
-            html.Div(id='filter-dam-count', style={'paddingTop': '10px', 'fontWeight': 'bold'})
-        ])
-    return None
+            html.P("No dam selected.", style={'textAlign': 'center', 'marginTop': '20px', 'color': '#ffffff'}),
+            html.Br(),
+            html.Button("Get Latest Info via ChatGPT", id='chatgpt-fetch-button', n_clicks=0,
+                        style={'marginTop': '15px', 'backgroundColor': '#00baff', 'color': 'white', 'border': 'none', 'padding': '10px'}),
+            html.Div(id='chatgpt-response', style={'marginTop': '20px', 'whiteSpace': 'pre-wrap'})
+        ]), None
+
+    return dam_details(dam_name), dam_name
+
+
+# Callback: Render Dam Filter tab content (slider + state dropdown + count) the first time it is shown
+@app.callback(
+    Output('tab-filter-content', 'children'),
+    Output('filter-tab-rendered', 'data'),
+    Input('tabs', 'value'),
+    State('filter-tab-rendered', 'data')
+)
+def render_filter_tab(tab, rendered):
+    if tab != 'tab-filter' or rendered:
+        raise PreventUpdate
+
+    min_height, max_height = HEIGHT_MIN, HEIGHT_MAX
+    return html.Div([
+        html.H3("Filter Dams by Height (Ft) and State"),
+        dcc.RangeSlider(
+            id='height-slider',
+            min=min_height,
+            max=max_height,
+            step=1,
+            value=[min_height, max_height],
+            marks={min_height: str(min_height), max_height: str(max_height)},
+            tooltip={"placement": "bottom", "always_visible": True}
+        ),
+        dcc.Dropdown(
+            id='filter-state-dropdown',
+            options=STATE_OPTIONS,
+            placeholder="Select a state (optional)",
+            clearable=True,
+            style={'backgroundColor': '#2c2c2c', 'color': '#fff', 'marginTop': '20px'}
+        ),
+        html.Div(id='filtered-dam-list', style={'marginTop': '20px', 'maxHeight': '400px', 'overflowY': 'auto'}),
+        html.Div(id='filter-dam-count', style={'paddingTop': '10px', 'fontWeight': 'bold'}),
+        html.Div([
+            html.A("Download CSV", id='export-csv', download='dams.csv', className='btn btn-outline-info btn-sm me-2'),
+            html.A("Download Parquet", id='export-parquet', download='dams.parquet', className='btn btn-outline-info btn-sm')
+        ], style={'paddingTop': '10px'})
+    ]), True
 
 
 # Callback: Filter dams by height and state for Dam Filter tab
@@ -286,12 +345,10 @@ def render_filter_tab(tab):
 )
 def filter_dams_by_height_and_state(height_range, selected_state):
     min_h, max_h = height_range
-    filtered = df[(df['Dam Height (Ft)'] >= min_h) & (df['Dam Height (Ft)'] <= max_h)]
-    if height_range == [int(df['Dam Height (Ft)'].min()), int(df['Dam Height (Ft)'].max())] and not selected_state:
+    if height_range == [HEIGHT_MIN, HEIGHT_MAX] and not selected_state:
         return html.P("Use the slider or state dropdown to filter dams."), ""
 
-    if selected_state:
-        filtered = filtered[filtered['State'] == selected_state]
+    filtered = dam_index.select(min_h, max_h, selected_state)
 
     if filtered.empty:
         return html.P("No dams found with selected criteria."), ""
@@ -306,6 +363,46 @@ def filter_dams_by_height_and_state(height_range, selected_state):
         )) for _, row in filtered.iterrows()
     ]), count_text
 
+# Callback: Point the download links at the export route for the current filter
+@app.callback(
+    Output('export-csv', 'href'),
+    Output('export-parquet', 'href'),
+    Input('height-slider', 'value'),
+    Input('filter-state-dropdown', 'value')
+)
+def update_export_links(height_range, selected_state):
+    query = f"?min={height_range[0]}&max={height_range[1]}"
+    if selected_state:
+        query += f"&state={quote(selected_state)}"
+    return (app.get_relative_path('/export/dams.csv') + query,
+            app.get_relative_path('/export/dams.parquet') + query)
+
+
+# Export route: streams the same selection as the Dam Filter list, a chunk of rows at a time
+@app.server.route('/export/dams.<fmt>')
+def export_dams(fmt):
+    args = flask.request.args
+    try:
+        min_h = float(args.get('min', dam_index.min_height))
+        max_h = float(args.get('max', dam_index.max_height))
+    except ValueError:
+        return "min and max must be numbers", 400
+    chunks = dam_index.chunks(min_h, max_h, args.get('state') or None)
+
+    if fmt == 'csv':
+        body, mimetype = csv_chunks(chunks), 'text/csv'
+    elif fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return "Parquet export needs pyarrow", 501
+        body, mimetype = parquet_chunks(chunks, df.dtypes), 'application/vnd.apache.parquet'
+    else:
+        return "Unknown export format", 404
+    return flask.Response(flask.stream_with_context(body), mimetype=mimetype,
+                          headers={'Content-Disposition': f'attachment; filename=dams.{fmt}'})
+
+
 @app.callback(
     Output('selected-dam-store', 'data'),
     Output('tabs', 'value'),
@@ -0,0 +1,126 @@
+'''
+A scikit-learn RandomForestRegressor flattened into contiguous NumPy arrays.
+
+All trees' nodes are stored back to back (feature, threshold, left, right,
+value), one .npy file each, so loading is a handful of memory maps instead of
+unpickling thousands of Python objects, and only the pages that predictions
+touch become resident.
+
+Export once, from the repo root:
+
+    python -m figure_fridays.week_21.app.forest
+'''
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+
+def export_forest(model, path):
+    '''Write the trees of a fitted single-output forest regressor to the directory `path`.'''
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        if tree.value.shape[1:] != (1, 1):
+            raise ValueError("Only single-output regression forests can be exported")
+        n = tree.node_count
+        leaf = tree.children_left == -1
+        nodes = np.arange(n)
+        # Leaves point to themselves, so every sample can take max_depth steps without masking
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(np.where(leaf, 0.0, tree.threshold))
+        left.append(np.where(leaf, nodes, tree.children_left) + offset)
+        right.append(np.where(leaf, nodes, tree.children_right) + offset)
+        value.append(tree.value[:, 0, 0])
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    os.makedirs(path, exist_ok=True)
+    arrays = {
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'left': np.concatenate(left).astype(np.int32),
+        'right': np.concatenate(right).astype(np.int32),
+        'value': np.concatenate(value).astype(np.float64),
+        'roots': np.asarray(roots, dtype=np.int32),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), array)
+    names = getattr(model, 'feature_names_in_', None)
+    meta = {
+        'n_features': int(model.n_features_in_),
+        'max_depth': int(max_depth),
+        'feature_names': None if names is None else [str(name) for name in names],
+    }
+    with open(os.path.join(path, 'meta.json'), 'w') as fh:
+        json.dump(meta, fh)
+    return path
+
+
+class CompactForest:
+    '''
+    Drop-in replacement for the forest's predict(). Inputs are cast to float32
+    before comparing, as sklearn does, so predictions match it to float tolerance.'''
+
+    def __init__(self, path, mmap=True):
+        with open(os.path.join(path, 'meta.json')) as fh:
+            meta = json.load(fh)
+        self.n_features_in_ = meta['n_features']
+        self.max_depth = meta['max_depth']
+        if meta['feature_names'] is not None:
+            self.feature_names_in_ = np.asarray(meta['feature_names'], dtype=object)
+        mode = 'r' if mmap else None
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mode))
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def _check(self, X):
+        names = getattr(self, 'feature_names_in_', None)
+        if hasattr(X, 'columns') and names is not None and list(X.columns) != list(names):
+            raise ValueError("The feature names should match those that were passed during fit.")
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[-1]} features, but the forest expects {self.n_features_in_}")
+        return X.astype(np.float64)
+
+    def predict_trees(self, X):
+        '''Per-tree predictions, shaped (n_samples, n_estimators); all trees are walked together.'''
+        X = self._check(X)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node]
+
+    def predict(self, X):
+        return self.predict_trees(X).mean(axis=1)
+
+
+def tree_predictions(model, X):
+    '''(n_samples, n_estimators) predictions of every tree of a CompactForest or fitted sklearn forest.'''
+    if hasattr(model, 'predict_trees'):
+        return model.predict_trees(X)
+    # The estimators were fitted on plain arrays; each one sees all rows at once
+    X = np.asarray(X, dtype=np.float32)
+    return np.column_stack([estimator.predict(X) for estimator in model.estimators_])
+
+
+def compact_path(model_path):
+    return os.path.splitext(model_path)[0] + '.forest'
+
+
+if __name__ == '__main__':
+    model_path = sys.argv[1] if len(sys.argv) > 1 else 'figure_fridays/week_21/app/rf_co2_mdl.pkl'
+    with open(model_path, 'rb') as f:
+        print(export_forest(pickle.load(f), compact_path(model_path)))
@@ -1,12 +1,24 @@
+import os
 import pickle
 import pandas as pd
 import numpy as np
 
-def load_model(path='figure_fridays/week_21/app/rf_co2_mdl.pkl'):
+from figure_fridays.week_21.app.forest import CompactForest, compact_path, tree_predictions
+from figure_fridays.week_21.app.scenarios import EMISSION_COLS, base_features
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# predict_all_countries evaluates nations in about this many batches, reporting progress after each
+PROGRESS_STEPS = 20
+
+def load_model(path=os.path.join(HERE, 'rf_co2_mdl.pkl'), compact=True):
+    # Prefer the memory-mapped export next to the pickle (python -m figure_fridays.week_21.app.forest)
+    if compact and os.path.isdir(compact_path(path)):
+        return CompactForest(compact_path(path))
     with open(path, 'rb') as f:
         return pickle.load(f)
 
-def load_training_cols(path='figure_fridays/week_21/app/training_cols.txt'):
+def load_training_cols(path=os.path.join(HERE, 'training_cols.txt')):
     with open(path, 'rb') as fp:
         return pickle.load(fp)
     
@@ -86,39 +98,62 @@ def predict_future_emissions_v3(selected_country, base_df, mdl, training_cols, y
     return pd.DataFrame(future_preds)
 
     
-def predict_all_countries(df, training_cols=None, model=None, years_to_predict=[2022, 2023, 2024]):
+def predict_all_countries(df, training_cols=None, model=None, years_to_predict=[2022, 2023, 2024], progress=None,
+                          interval=(5, 95)):
+    # Same extrapolation as predict_future_emissions_v3, for every nation and year in one
+    # pass over the trees; CO2_lower/CO2_upper are percentiles of the individual trees' predictions.
+    # progress(done, total) is called after each batch of nations, e.g. to report from a background callback
     if model is None:
         model = load_model()
     
     if training_cols is None:
         training_cols = load_training_cols()
 
-    all_preds = []
-
-    for country in df['Nation'].unique():
-        country_preds = predict_future_emissions_v3(
-            selected_country=country,
-            base_df=df,
-            mdl=model,
-            training_cols=training_cols,
-            years_to_predict=years_to_predict
-        )
+    training_cols = list(training_cols)
+    nations, features, trends = base_features(df, df['Nation'].unique(), training_cols)
+    emission_idx = [training_cols.index(col) for col in EMISSION_COLS]
+    year_idx = training_cols.index('Year')
 
-        if not country_preds.empty:
-            country_preds['Source'] = 'Predicted'
-            country_preds.rename(columns={'Predicted_CO2': 'CO2'}, inplace=True)
-            all_preds.append(country_preds)
-
-    return pd.concat(all_preds, ignore_index=True)
-
-def get_combined_df(df, model, training_cols, years_to_predict=[2022,2023,2024]):
+    # One block of rows per year, each grown from the previous year's emissions
+    blocks = []
+    for year in years_to_predict:
+        features = features.copy()
+        # Clamp to 0 if negative due to extrapolation
+        features[:, emission_idx] = np.maximum(features[:, emission_idx] * (1 + trends), 0)
+        features[:, year_idx] = year
+        blocks.append(features)
+    if not nations or not blocks:
+        return pd.DataFrame(columns=['Nation', 'Year', 'CO2', 'CO2_lower', 'CO2_upper', 'Source'])
+
+    # Rows grouped by nation, as before: nation i, year j is row i * len(years) + j
+    rows = np.stack(blocks, axis=1).reshape(-1, len(training_cols))
+    batch = -(-len(nations) // PROGRESS_STEPS) * len(blocks)
+    parts = []
+    for start in range(0, len(rows), batch):
+        parts.append(tree_predictions(model, pd.DataFrame(rows[start:start + batch], columns=training_cols)))
+        if progress is not None:
+            progress(min(start + batch, len(rows)) // len(blocks), len(nations))
+    per_tree = np.concatenate(parts)
+    lower, upper = np.percentile(per_tree, interval, axis=1)
+    preds = pd.DataFrame({
+        'Nation': np.repeat(nations, len(blocks)),
+        'Year': np.tile(years_to_predict, len(nations)),
+        'CO2': per_tree.mean(axis=1),
+        'CO2_lower': lower,
+        'CO2_upper': upper,
+        'Source': 'Predicted'
+    })
+
+    return preds
+
+def get_combined_df(df, model, training_cols, years_to_predict=[2022,2023,2024], progress=None):
     # Historical
     hist = df[['Nation', 'Year', 'Total CO2 emissions from fossil-fuels and cement production (thousand metric tons of C)']].copy()
     hist.rename(columns={'Total CO2 emissions from fossil-fuels and cement production (thousand metric tons of C)': 'CO2'}, inplace=True)
     hist['Source'] = 'Actual'
 
     # Predicted
-    future = predict_all_countries(df, training_cols, model, years_to_predict)
+    future = predict_all_countries(df, training_cols, model, years_to_predict, progress=progress)
 
     # Combine
     return pd.concat([hist, future], ignore_index=True)
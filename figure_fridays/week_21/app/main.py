@@ -1,200 +1,316 @@
-import pandas as pd
-import numpy as np
+import os
+
 import dash
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, DiskcacheManager
 import dash_bootstrap_components as dbc
-import plotly.express as px
-import plotly.graph_objects as go
+import diskcache
+
+from figure_fridays.lazy import LazyResource, add_health_routes, overall_state, warm_in_background
+from figure_fridays.memory import add_memory_route, register
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(HERE, 'dataset', 'nation.1751_2021.xlsx')
+MODEL_PATH = os.path.join(HERE, 'rf_co2_mdl.pkl')
+TRAINING_COLS_PATH = os.path.join(HERE, 'training_cols.txt')
+# Predictions run as background jobs in their own processes, tracked in this disk cache,
+# so a Predict click does not hold a gunicorn worker for the whole forecast
+JOB_CACHE_DIR = os.environ.get('JOB_CACHE_DIR', '.job_cache')
+
+
+# pandas, sklearn (via the pickled model), openpyxl and plotly load on first use
+# or in the background warm-up, so a fresh worker answers requests right away
+def load_libraries():
+    import pandas  # noqa: F401
+    import plotly.graph_objects  # noqa: F401
+    from figure_fridays import fastfig
+    fastfig.enable_fast_json()
+    return fastfig
+
+
+def load_data():
+    libraries.get()
+    import pandas as pd
+    return pd.read_excel(DATA_PATH, engine='openpyxl')
+
+
+def load_model():
+    libraries.get()
+    from figure_fridays.week_21.app.helper import load_model
+    return load_model(MODEL_PATH)
+
 
-from figure_fridays.week_21.app.helper import load_model, load_training_cols, parse_years_input, get_combined_df
+def load_training_cols():
+    libraries.get()
+    from figure_fridays.week_21.app.helper import load_training_cols
+    return load_training_cols(TRAINING_COLS_PATH)
 
-# Load data
-df = pd.read_excel('figure_fridays/week_21/app/dataset/nation.1751_2021.xlsx', engine='openpyxl')
-nations = df['Nation'].unique()
 
-model = load_model()
-training_cols = load_training_cols()
+libraries = LazyResource('libraries', load_libraries, imports=True)
+data = LazyResource('data', load_data)
+model = LazyResource('model', load_model)
+training_cols = LazyResource('training_cols', load_training_cols)
+RESOURCES = [libraries, data, model, training_cols]
+
+# Memory accounting (/_memory); resources still cold report 0
+for resource in (data, model, training_cols):
+    register(f'week_21.{resource.name}', lambda resource=resource: resource._value, owner=__name__)
 
 # Initialize Dash app
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CYBORG], suppress_callback_exceptions=True)
+background_callback_manager = DiskcacheManager(diskcache.Cache(JOB_CACHE_DIR))
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CYBORG], suppress_callback_exceptions=True,
+                background_callback_manager=background_callback_manager)
 app.title = "Carbon Emission Analysis"
+add_health_routes(app.server, RESOURCES)
+add_memory_route(app.server, owner=__name__)
+
 
 # Layout
-app.layout = dbc.Container([
-    html.H1(
-        "🌍 Carbon Emission Analysis",
-        className="text-center my-4",
-        style={
-            "color": "#00FFFF",
-            "fontWeight": "bold",
-            "fontSize": "2.5rem",
-            "letterSpacing": "1px",
-            "textShadow": "1px 1px 3px #000"
-        }
-    ),
+def warming_layout():
+    '''
+    Shown until the dataset and model are loaded; reloads the page once they are.
+    Prediction jobs fork from the server process, so they start with both in memory.'''
+    return dbc.Container([
+        html.H4("Loading emissions data…", className="text-center my-5"),
+        dcc.Location(id='warm-up-location', refresh=True),
+        dcc.Interval(id='warm-up-poll', interval=1000)
+    ], fluid=True)
+
+
+def error_layout():
+    '''Shown while a resource failed to load; reloading retries it once its backoff has passed.'''
+    return dbc.Container([
+        html.H4("The emissions data could not be loaded.", className="text-center my-5"),
+        html.Ul([html.Li(f"{resource.name}: {resource.error}") for resource in RESOURCES if resource.error]),
+        html.P("Reload the page to try again.", className="text-center")
+    ], fluid=True)
+
+
+def serve_layout():
+    if overall_state(RESOURCES) != 'warm':
+        warm_in_background(RESOURCES)
+        # A retry that has just started shows the warming page again
+        return error_layout() if overall_state(RESOURCES) == 'error' else warming_layout()
+
+    df = data.get()
+    nations = df['Nation'].unique()
+    return dbc.Container([
+        # Latest year in the data, for the preset buttons' clientside callbacks
+        dcc.Store(id='max-year', data=int(df['Year'].max())),
+
+        html.H1(
+            "🌍 Carbon Emission Analysis",
+            className="text-center my-4",
+            style={
+                "color": "#00FFFF",
+                "fontWeight": "bold",
+                "fontSize": "2.5rem",
+                "letterSpacing": "1px",
+                "textShadow": "1px 1px 3px #000"
+            }
+        ),
 
-    dbc.Row([
-        dbc.Col([
-            html.Label("Country"),
-            dcc.Dropdown(
-                id='country-dropdown',
-                options=[{'label': nation, 'value': nation} for nation in sorted(nations)],
-                value='UNITED STATES OF AMERICA',
-                style={
-                    'backgroundColor': '#2a2a2a',
-                    'color': '#ffffff',
-                    'border': '1px solid #555',
-                }
-            )
-        ], xs=12, md=4, className="mb-2"),
+        dbc.Row([
+            dbc.Col([
+                html.Label("Country"),
+                dcc.Dropdown(
+                    id='country-dropdown',
+                    options=[{'label': nation, 'value': nation} for nation in sorted(nations)],
+                    value='UNITED STATES OF AMERICA',
+                    style={
+                        'backgroundColor': '#2a2a2a',
+                        'color': '#ffffff',
+                        'border': '1px solid #555',
+                    }
+                )
+            ], xs=12, md=4, className="mb-2"),
+
+            dbc.Col([
+                html.Label("Year Range"),
+                dbc.ButtonGroup(
+                    [dbc.Button(f"{i}Y", id=f'btn-{i}', n_clicks=0, color="info", outline=True) for i in range(10, 60, 10)],
+                    size="md",
+                    id="preset-buttons",
+                    className="d-flex flex-wrap"
+                )
+            ], xs=12, md=4, className="mb-2"),
+
+            dbc.Col([
+                html.Label("Custom Range (From - To)"),
+                dbc.InputGroup([
+                    dbc.Input(
+                        id="from-year",
+                        type="number",
+                        value=df["Year"].max() - 10,
+                        max=df["Year"].max(),
+                        style={
+                            'backgroundColor': '#2a2a2a',
+                            'color': 'white',
+                            'border': '1px solid #555'
+                        }
+                    ),
+                    dbc.Input(
+                        id="to-year",
+                        type="number",
+                        value=df["Year"].max(),
+                        min=df["Year"].min(),
+                        max=df["Year"].max(),
+                        style={
+                            'backgroundColor': '#2a2a2a',
+                            'color': 'white',
+                            'border': '1px solid #555'
+                        }
+                    ),
+                ])
+            ], xs=12, md=4, className="mb-2"),
+        ], className="mb-4 g-2 align-items-end"),
+
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='emission-graph')
+            ])
+        ]),
 
-        dbc.Col([
-            html.Label("Year Range"),
-            dbc.ButtonGroup(
-                [dbc.Button(f"{i}Y", id=f'btn-{i}', n_clicks=0, color="info", outline=True) for i in range(10, 60, 10)],
-                size="md",
-                id="preset-buttons",
-                className="d-flex flex-wrap"
-            )
-        ], xs=12, md=4, className="mb-2"),
+        dbc.Row([
+            dbc.Col([
+                html.Label("Select Emission Types"),
+                dcc.Checklist(
+                    id='fuel-types',
+                    options=[
+                        {'label': 'Solid', 'value': 'solid'},
+                        {'label': 'Liquid', 'value': 'liquid'},
+                        {'label': 'Gas', 'value': 'gas'},
+                    ],
+                    value=['solid', 'liquid', 'gas'],
+                    labelStyle={'display': 'inline-block', 'margin-right': '10px'},
+                    inputStyle={"margin-right": "5px"},
+                    style={'color': 'white'}
+                )
+            ])
+        ], className="mb-4"),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='solid-graph'), xs=12, md=4),
+            dbc.Col(dcc.Graph(id='liquid-graph'), xs=12, md=4),
+            dbc.Col(dcc.Graph(id='gas-graph'), xs=12, md=4)
+        ], className="mb-4"),
 
+        dbc.Row([
         dbc.Col([
-            html.Label("Custom Range (From - To)"),
+            html.Label("Select Prediction Years (comma separated)"),
             dbc.InputGroup([
                 dbc.Input(
-                    id="from-year",
-                    type="number",
-                    value=df["Year"].max() - 10,
-                    max=df["Year"].max(),
-                    style={
-                        'backgroundColor': '#2a2a2a',
-                        'color': 'white',
-                        'border': '1px solid #555'
-                    }
-                ),
-                dbc.Input(
-                    id="to-year",
-                    type="number",
-                    value=df["Year"].max(),
-                    min=df["Year"].min(),
-                    max=df["Year"].max(),
+                    id='predict-years-input',
+                    type='text',
+                    value='2022,2023,2024',
+                    placeholder='Enter years separated by commas',
                     style={
                         'backgroundColor': '#2a2a2a',
                         'color': 'white',
                         'border': '1px solid #555'
                     }
                 ),
+                dbc.Button("Predict", id='predict-button', color='info', n_clicks=0)
+            ]),
+            html.Div(id='predict-years-error', style={'color': 'red', 'marginTop': '5px'}),
+            dbc.Progress(id='predict-progress', value=0, striped=True, animated=True, className="mt-2",
+                         style={'visibility': 'hidden'})
             ])
-        ], xs=12, md=4, className="mb-2"),
-    ], className="mb-4 g-2 align-items-end"),
-
-    dbc.Row([
+        ], className="mb-4"),
+
+        # Scenario mode: yearly growth of each fuel drawn from a normal distribution
+        dbc.Row([
+            dbc.Col([
+                dbc.Switch(id='scenario-toggle', label="Scenario mode (fan chart)", value=False),
+                html.Label("Simulated paths"),
+                dbc.Input(id='scenario-paths', type='number', value=2000, min=100, max=20000, step=100,
+                          style={'backgroundColor': '#2a2a2a', 'color': 'white', 'border': '1px solid #555'})
+            ], xs=12, md=3, className="mb-2"),
+        ] + [
+            dbc.Col([
+                html.Label(f"{label} growth %/year (mean, sd)"),
+                dbc.InputGroup([
+                    dbc.Input(id=f'growth-{fuel}-mean', type='number', value=0, step=0.5,
+                              style={'backgroundColor': '#2a2a2a', 'color': 'white', 'border': '1px solid #555'}),
+                    dbc.Input(id=f'growth-{fuel}-sd', type='number', value=5, min=0, step=0.5,
+                              style={'backgroundColor': '#2a2a2a', 'color': 'white', 'border': '1px solid #555'})
+                ])
+            ], xs=12, md=3, className="mb-2")
+            for fuel, label in [('solid', 'Solid'), ('liquid', 'Liquid'), ('gas', 'Gas')]
+        ], className="mb-4 g-2 align-items-end"),
+
+        dbc.Row([
         dbc.Col([
-            dcc.Graph(id='emission-graph')
-        ])
-    ]),
-
-    dbc.Row([
-        dbc.Col([
-            html.Label("Select Emission Types"),
-            dcc.Checklist(
-                id='fuel-types',
-                options=[
-                    {'label': 'Solid', 'value': 'solid'},
-                    {'label': 'Liquid', 'value': 'liquid'},
-                    {'label': 'Gas', 'value': 'gas'},
-                ],
-                value=['solid', 'liquid', 'gas'],
-                labelStyle={'display': 'inline-block', 'margin-right': '10px'},
-                inputStyle={"margin-right": "5px"},
-                style={'color': 'white'}
+            dcc.Loading(
+                id="loading-combined-graph",
+                type="circle",   # You can also use 'dot', 'cube', 'graph', etc.
+                children=dcc.Graph(id='combined-graph')
             )
         ])
-    ], className="mb-4"),
-
-    dbc.Row([
-        dbc.Col(dcc.Graph(id='solid-graph'), xs=12, md=4),
-        dbc.Col(dcc.Graph(id='liquid-graph'), xs=12, md=4),
-        dbc.Col(dcc.Graph(id='gas-graph'), xs=12, md=4)
-    ], className="mb-4"),
-
-    dbc.Row([
-    dbc.Col([
-        html.Label("Select Prediction Years (comma separated)"),
-        dbc.InputGroup([
-            dbc.Input(
-                id='predict-years-input',
-                type='text',
-                value='2022,2023,2024',
-                placeholder='Enter years separated by commas',
-                style={
-                    'backgroundColor': '#2a2a2a',
-                    'color': 'white',
-                    'border': '1px solid #555'
-                }
-            ),
-            dbc.Button("Predict", id='predict-button', color='info', n_clicks=0)
         ]),
-        html.Div(id='predict-years-error', style={'color': 'red', 'marginTop': '5px'})
-        ])
-    ], className="mb-4"),
-
-    dbc.Row([
-    dbc.Col([
-        dcc.Loading(
-            id="loading-combined-graph",
-            type="circle",   # You can also use 'dot', 'cube', 'graph', etc.
-            children=dcc.Graph(id='combined-graph')
-        )
-    ])
-    ]),
 
-], fluid=True)
+    ], fluid=True)
+
+
+app.layout = serve_layout
+
 
-# Highlight preset buttons
 @app.callback(
+    Output('warm-up-location', 'href'),
+    Input('warm-up-poll', 'n_intervals'),
+    prevent_initial_call=True
+)
+def reload_when_warm(n_intervals):
+    # Also reloads on a failed load, to show the error page instead of polling forever
+    return app.get_relative_path('/') if overall_state(RESOURCES) in ('warm', 'error') else dash.no_update
+
+# Highlight preset buttons (runs in the browser; the latest year comes from the max-year store)
+app.clientside_callback(
+    """
+    function highlight_selected() {
+        const presets = [10, 20, 30, 40, 50];
+        const fromYear = arguments[presets.length];
+        const maxYear = arguments[presets.length + 1];
+        const clicked = dash_clientside.callback_context.triggered
+            .map(t => t.prop_id)
+            .find(id => id.startsWith('btn-'));
+
+        let selected;
+        if (clicked) {
+            selected = parseInt(clicked.split('.')[0].split('-')[1]);
+        } else if (fromYear === null || fromYear === undefined) {
+            selected = 10;
+        } else {
+            const diff = maxYear - fromYear;
+            selected = presets.reduce((best, p) => Math.abs(p - diff) < Math.abs(best - diff) ? p : best);
+        }
+        return presets.map(() => 'info').concat(presets.map(p => p !== selected));
+    }
+    """,
     [Output(f'btn-{i}', 'color') for i in range(10, 60, 10)] +
     [Output(f'btn-{i}', 'outline') for i in range(10, 60, 10)],
     [Input(f'btn-{i}', 'n_clicks') for i in range(10, 60, 10)],
     Input('from-year', 'value'),
+    State('max-year', 'data'),
 )
-def highlight_selected(*btn_clicks_and_from_year):
-    btn_clicks = btn_clicks_and_from_year[:-1]
-    from_year = btn_clicks_and_from_year[-1]
-
-    ctx = dash.callback_context
-    if ctx.triggered and ctx.triggered[0]['prop_id'].startswith('btn-'):
-        clicked_id = ctx.triggered[0]["prop_id"].split('.')[0]
-        selected_year = int(clicked_id.split('-')[1])
-    else:
-        if from_year is None:
-            selected_year = 10
-        else:
-            max_year = df["Year"].max()
-            diff = max_year - from_year
-            selected_year = min(range(10, 60, 10), key=lambda x: abs(x - diff))
-
-    colors, outlines = [], []
-    for i in range(10, 60, 10):
-        colors.append("info")
-        outlines.append(i != selected_year)
-
-    return colors + outlines
-
-# Update from-year when preset buttons clicked
-@app.callback(
+
+# Update from-year when preset buttons clicked (runs in the browser)
+app.clientside_callback(
+    """
+    function update_from_year() {
+        const maxYear = arguments[arguments.length - 1];
+        const triggered = dash_clientside.callback_context.triggered;
+        if (!triggered.length) {
+            return dash_clientside.no_update;
+        }
+        const years = parseInt(triggered[0].prop_id.split('.')[0].split('-')[1]);
+        return maxYear - years;
+    }
+    """,
     Output('from-year', 'value'),
     [Input(f'btn-{i}', 'n_clicks') for i in range(10, 60, 10)],
+    State('max-year', 'data'),
     prevent_initial_call=True
 )
-def update_from_year(*btn_clicks):
-    ctx = dash.callback_context
-    if not ctx.triggered:
-        return dash.no_update
-
-    btn_id = ctx.triggered[0]["prop_id"].split(".")[0]
-    years = int(btn_id.split("-")[1])
-    return df["Year"].max() - years
 
 # Main graph
 @app.callback(
@@ -210,37 +326,34 @@ def update_main_graph(from_year, to_year, selected_country):
     if from_year > to_year:
         from_year, to_year = to_year, from_year
 
+    df = data.get()
+    ff = libraries.get()
     country_data = df[df['Nation'] == selected_country]
     filtered = country_data[(country_data['Year'] >= from_year) & (country_data['Year'] <= to_year)]
 
     # calculate percentage change in CO2 emissions
     col = 'Total CO2 emissions from fossil-fuels and cement production (thousand metric tons of C)'
-    filtered['pct_change'] = (filtered[col].pct_change() * 100).round(2)
-
-    fig = px.line(
-        filtered,
-        x='Year',
-        y='Total CO2 emissions from fossil-fuels and cement production (thousand metric tons of C)',
-        custom_data=['pct_change'],
-        title=f"{selected_country} - CO₂ Emissions ({from_year} to {to_year})",
-        labels={'Year': 'Year', 'Total CO2 emissions from fossil-fuels and cement production (thousand metric tons of C)': 'Total CO₂ Emissions'},
-    )
+    emissions = filtered[col]
+    pct_change = (emissions.pct_change() * 100).round(2).to_numpy()
 
-    fig.update_traces(
+    traces = ff.px_lines(
+        filtered['Year'], emissions, 'Year', 'Total CO₂ Emissions',
+        customdata=pct_change[:, None],
         hovertemplate=
         'Year: %{x}<br>' +
         'Emissions: %{y:,.0f}<br>' +
         'Change: %{customdata[0]:+.2f}%<extra></extra>'
     )
 
-    max_val = filtered['Total CO2 emissions from fossil-fuels and cement production (thousand metric tons of C)'].max()
-    fig.update_layout(
+    max_val = emissions.max()
+    return ff.figure(traces, ff.px_layout(
+        f"{selected_country} - CO₂ Emissions ({from_year} to {to_year})",
+        'Year', 'Total CO₂ Emissions',
         yaxis=dict(range=[0, max_val * 1.1]),
         paper_bgcolor="#2a2a2a",
         plot_bgcolor="#2a2a2a",
         font=dict(color="white")
-    )
-    return fig
+    ))
 
 # Subgraphs with checklist
 @app.callback(
@@ -259,6 +372,8 @@ def update_subgraphs(from_year, to_year, selected_country, selected_graphs):
     if from_year > to_year:
         from_year, to_year = to_year, from_year
 
+    df = data.get()
+    ff = libraries.get()
     country_data = df[df['Nation'] == selected_country]
     filtered = country_data[(country_data['Year'] >= from_year) & (country_data['Year'] <= to_year)]
 
@@ -283,9 +398,10 @@ def update_subgraphs(from_year, to_year, selected_country, selected_graphs):
                     }]
                 }
             }
-        filtered['pct_change'] = (filtered[column].pct_change() * 100).round(2)
-        fig = px.line(filtered, x='Year', y=column, custom_data=['pct_change'], title=title, labels={'Year': 'Year', column: title})
-        fig.update_traces(
+        pct_change = (filtered[column].pct_change() * 100).round(2).to_numpy()
+        traces = ff.px_lines(
+            filtered['Year'], filtered[column], 'Year', title,
+            customdata=pct_change[:, None],
             hovertemplate=
             'Year: %{x}<br>' +
             'Emissions: %{y:,.0f}<br>' +
@@ -293,13 +409,13 @@ def update_subgraphs(from_year, to_year, selected_country, selected_graphs):
         )
 
         max_val = filtered[column].max()
-        fig.update_layout(
+        return ff.figure(traces, ff.px_layout(
+            title, 'Year', title,
             yaxis=dict(range=[0, max_val * 1.1]),
             paper_bgcolor="#2a2a2a",
             plot_bgcolor="#2a2a2a",
             font=dict(color="white")
-        )
-        return fig
+        ))
 
     solid_fig = create_fig("Emissions from solid fuel consumption", "Solid Fuel Emissions", 'solid' in selected_graphs)
     liquid_fig = create_fig("Emissions from liquid fuel consumption", "Liquid Fuel Emissions", 'liquid' in selected_graphs)
@@ -307,7 +423,7 @@ def update_subgraphs(from_year, to_year, selected_country, selected_graphs):
 
     return solid_fig, liquid_fig, gas_fig
 
-# Combined graph: actual + predicted
+# Combined graph: actual + predicted, computed as a background job; changing country cancels it
 @app.callback(
     Output('combined-graph', 'figure'),
     Output('predict-years-error', 'children'),
@@ -318,13 +434,27 @@ def update_subgraphs(from_year, to_year, selected_country, selected_graphs):
         State('country-dropdown', 'value'),
         State('from-year', 'value'),
         State('to-year', 'value'),
-        State('predict-years-input', 'value')
-    ]
+        State('predict-years-input', 'value'),
+        State('scenario-toggle', 'value'),
+        State('scenario-paths', 'value')
+    ] + [State(f'growth-{fuel}-{stat}', 'value') for fuel in ('solid', 'liquid', 'gas') for stat in ('mean', 'sd')],
+    background=True,
+    progress=[Output('predict-progress', 'value'), Output('predict-progress', 'label')],
+    running=[
+        (Output('predict-button', 'disabled'), True, False),
+        (Output('predict-progress', 'style'), {'visibility': 'visible'}, {'visibility': 'hidden'}),
+    ],
+    cancel=[Input('country-dropdown', 'value')]
 )
-def update_combined_graph(n_clicks, selected_country, from_year, to_year, predict_years_str):
+def update_combined_graph(set_progress, n_clicks, selected_country, from_year, to_year, predict_years_str,
+                          scenario_mode, n_paths, *growth_inputs):
     # ctx = dash.callback_context
     # if not ctx.triggered or ctx.triggered[0]['prop_id'].split('.')[0] != 'predict-button':
     #     return dash.no_update, ""
+    libraries.get()
+    import plotly.graph_objects as go
+    from figure_fridays.week_21.app.helper import parse_years_input, get_combined_df
+    from figure_fridays.week_21.app.scenarios import simulate, fan_chart_df
 
     error_msg = ""
     if not selected_country or from_year is None or to_year is None or predict_years_str is None:
@@ -340,7 +470,18 @@ def update_combined_graph(n_clicks, selected_country, from_year, to_year, predic
         error_msg = "Invalid input for prediction years. Use comma separated integers like 2022,2023,2024."
         predict_years_input = []
 
-    combined_df = get_combined_df(df, model, training_cols, predict_years_input)
+    last_percent = -1
+
+    def report(done, total):
+        nonlocal last_percent
+        percent = done * 100 // total
+        if percent != last_percent:
+            last_percent = percent
+            set_progress((percent, f"{percent}%"))
+
+    set_progress((0, ""))
+    combined_df = get_combined_df(data.get(), model.get(), training_cols.get(), predict_years_input,
+                                  progress=report)
 
     # Filter actual data for country and year range
     actual = combined_df[
@@ -405,6 +546,28 @@ def update_combined_graph(n_clicks, selected_country, from_year, to_year, predic
             hoverinfo='skip'
         ))
 
+    # Prediction interval from the spread of the forest's trees
+    if not predicted.empty:
+        fig.add_trace(go.Scatter(
+            x=predicted['Year'],
+            y=predicted['CO2_upper'],
+            mode='lines',
+            line=dict(width=0),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=predicted['Year'],
+            y=predicted['CO2_lower'],
+            mode='lines',
+            line=dict(width=0),
+            name='Prediction Interval (5–95% of trees)',
+            fill='tonexty',
+            fillcolor='rgba(255,255,0,0.25)',
+            customdata=predicted[['CO2_upper']],
+            hovertemplate='Year: %{x}<br>Interval: %{y:,.0f} – %{customdata[0]:,.0f}<extra></extra>'
+        ))
+
     # Predicted points (yellow markers)
     if not predicted.empty:
         fig.add_trace(go.Scatter(
@@ -420,7 +583,35 @@ def update_combined_graph(n_clicks, selected_country, from_year, to_year, predic
             ),
             customdata=predicted[['pct_change']].round(2)
         ))
+    # Scenario fan chart: percentile bands of the simulated paths
     max_val = actual['CO2'].max()
+    if not actual.empty and not predicted.empty:
+        max_val = max(max_val, predicted['CO2_upper'].max())
+    if scenario_mode and predict_years_input:
+        values = [0 if value is None else value / 100 for value in growth_inputs]
+        growth = {fuel: (values[2 * i], abs(values[2 * i + 1])) for i, fuel in enumerate(('solid', 'liquid', 'gas'))}
+        n_paths = min(max(int(n_paths or 2000), 100), 20000)
+        nations, paths = simulate(data.get(), [selected_country], model.get(), training_cols.get(),
+                                  predict_years_input, growth, n_paths=n_paths)
+        if nations:
+            fan = fan_chart_df(predict_years_input, paths[0])
+            band = dict(mode='lines', line=dict(width=0), hoverinfo='skip')
+            fig.add_trace(go.Scatter(x=fan['Year'], y=fan['p95'], showlegend=False, **band))
+            fig.add_trace(go.Scatter(x=fan['Year'], y=fan['p5'], name='Scenario 5–95%', fill='tonexty',
+                                     fillcolor='rgba(255,165,0,0.2)', **band))
+            fig.add_trace(go.Scatter(x=fan['Year'], y=fan['p75'], showlegend=False, **band))
+            fig.add_trace(go.Scatter(x=fan['Year'], y=fan['p25'], name='Scenario 25–75%', fill='tonexty',
+                                     fillcolor='rgba(255,165,0,0.4)', **band))
+            fig.add_trace(go.Scatter(
+                x=fan['Year'],
+                y=fan['p50'],
+                mode='lines+markers',
+                name=f'Scenario median ({n_paths} paths)',
+                line=dict(color='orange', width=2),
+                hovertemplate='Year: %{x}<br>Median: %{y:,.0f}<extra></extra>'
+            ))
+            max_val = max(max_val, fan['p95'].max()) if not actual.empty else fan['p95'].max()
+
     fig.update_layout(
         yaxis=dict(range=[0, max_val * 1.1]),
         yaxis_title='CO₂ Emissions (thousand metric tons of C)',
@@ -435,5 +626,8 @@ def update_combined_graph(n_clicks, selected_country, from_year, to_year, predic
 
 server = app.server
 
+if os.environ.get('WARM_ON_START', '1') == '1':
+    warm_in_background(RESOURCES)
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,94 @@
+'''
+Monte Carlo emission scenarios for the week 21 forecast.
+
+Where predict_future_emissions_v3 extrapolates one path from the last two
+years' percent changes, a scenario draws each year's growth rate of solid,
+liquid and gas fuel emissions from a normal distribution (other emission
+columns keep their last-year trend). Every path of every nation is a row of
+one feature matrix, so each forecast year costs a single model call.
+'''
+import numpy as np
+import pandas as pd
+
+EMISSION_COLS = [
+    'Emissions from solid fuel consumption',
+    'Emissions from liquid fuel consumption',
+    'Emissions from gas fuel consumption',
+    'Emissions from cement production',
+    'Emissions from gas flaring',
+    'Emissions from bunker fuels (not included in the totals)'
+]
+
+FUEL_COLS = {
+    'solid': 'Emissions from solid fuel consumption',
+    'liquid': 'Emissions from liquid fuel consumption',
+    'gas': 'Emissions from gas fuel consumption',
+}
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def base_features(df, nations, training_cols):
+    '''
+    Last known row of each nation as model features, and each emission
+    column's percent change over its last year (0 where undefined), as in
+    predict_future_emissions_v3. Nations with fewer than two years are dropped.'''
+    last_two = df[df['Nation'].isin(nations)].sort_values('Year').groupby('Nation', sort=False).tail(2)
+    counts = last_two['Nation'].value_counts()
+    nations = [nation for nation in nations if counts.get(nation, 0) == 2]
+    last_two = last_two.set_index('Nation')
+    last = last_two.groupby(level=0).nth(-1).reindex(nations)
+    prev = last_two.groupby(level=0).nth(0).reindex(nations)
+
+    prev_vals = prev[EMISSION_COLS].to_numpy(float)
+    last_vals = last[EMISSION_COLS].to_numpy(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trends = (last_vals - prev_vals) / np.abs(prev_vals)
+    trends[(prev_vals == 0) | np.isnan(prev_vals) | np.isnan(last_vals)] = 0.0
+
+    # One-hot encode
+    encoded = pd.get_dummies(last.reset_index()).reindex(columns=training_cols, fill_value=0)
+    encoded = encoded.replace([np.inf, -np.inf], np.nan).fillna(0)
+    return nations, encoded.to_numpy(float), trends
+
+
+def simulate(df, nations, model, training_cols, years, growth, n_paths=2000, seed=None):
+    '''
+    Simulated CO2 predictions shaped (len(nations), n_paths, len(years)).
+
+    growth maps 'solid', 'liquid' and 'gas' to (mean, sd) of the yearly growth
+    rate as a fraction; fuels left out follow their last-year trend. Returns
+    the nations that had enough history together with the paths.'''
+    training_cols = list(training_cols)
+    nations, base, trends = base_features(df, nations, training_cols)
+    if not nations or not years:
+        return nations, np.empty((len(nations), n_paths, len(years)))
+
+    emission_idx = [training_cols.index(col) for col in EMISSION_COLS]
+    year_idx = training_cols.index('Year')
+    rng = np.random.default_rng(seed)
+
+    # Row i * n_paths + p is path p of nation i
+    X = np.repeat(base, n_paths, axis=0)
+    emissions = X[:, emission_idx]
+    rates = np.repeat(trends, n_paths, axis=0)
+    paths = np.empty((len(X), len(years)))
+
+    for step, year in enumerate(years):
+        for fuel, (mean, sd) in growth.items():
+            rates[:, EMISSION_COLS.index(FUEL_COLS[fuel])] = rng.normal(mean, sd, len(X))
+        # Clamp to 0 if negative due to extrapolation
+        emissions = np.maximum(emissions * (1 + rates), 0)
+        X[:, emission_idx] = emissions
+        X[:, year_idx] = year
+        paths[:, step] = model.predict(pd.DataFrame(X, columns=training_cols))
+
+    return nations, paths.reshape(len(nations), n_paths, len(years))
+
+
+def fan_chart_df(years, paths, percentiles=PERCENTILES):
+    '''Percentiles of one nation's (n_paths, len(years)) paths per year, columns p5, p25, ...'''
+    bands = np.percentile(paths, percentiles, axis=0)
+    summary = pd.DataFrame({f'p{q}': band for q, band in zip(percentiles, bands)})
+    summary.insert(0, 'Year', list(years))
+    return summary
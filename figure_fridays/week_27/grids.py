@@ -0,0 +1,136 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.interpolate import CloughTocher2DInterpolator, LinearNDInterpolator, NearestNDInterpolator
+from scipy.spatial import Delaunay
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.grid_cache')
+CACHE_VERSION = 1
+
+# Targets above this size are split into chunks and evaluated in a process pool
+CHUNK_SIZE = 50_000
+
+_worker_interpolator = None
+
+
+def build_interpolator(points, values, method='linear'):
+    '''
+    Same interpolants scipy.interpolate.griddata uses, but built once so the
+    triangulation can be reused for many target grids (and shipped to workers).'''
+    points = np.asarray(points, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if method == 'nearest':
+        return NearestNDInterpolator(points, values)
+    tri = Delaunay(points)
+    if method == 'linear':
+        return LinearNDInterpolator(tri, values)
+    if method == 'cubic' and points.shape[1] == 2:
+        return CloughTocher2DInterpolator(tri, values)
+    raise ValueError(f"Unsupported method {method!r} for {points.shape[1]}-D points")
+
+
+def _init_worker(interpolator):
+    global _worker_interpolator
+    _worker_interpolator = interpolator
+
+
+def _evaluate_chunk(targets):
+    return _worker_interpolator(targets)
+
+
+def interpolate(points, values, targets, method='linear', workers=None, chunk_size=CHUNK_SIZE):
+    '''
+    Interpolate scattered `values` at `points` (n, d) onto `targets` (m, d).
+
+    Small target sets are evaluated in-process; larger ones are split into
+    `chunk_size` pieces and evaluated across a process pool that receives the
+    triangulation once per worker.'''
+    interpolator = build_interpolator(points, values, method)
+    targets = np.asarray(targets, dtype=float)
+    if len(targets) <= chunk_size or workers == 1:
+        return interpolator(targets)
+
+    chunks = [targets[i:i + chunk_size] for i in range(0, len(targets), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(interpolator,)) as pool:
+        return np.concatenate(list(pool.map(_evaluate_chunk, chunks)))
+
+
+def cache_key(*parts):
+    digest = hashlib.sha1(str(CACHE_VERSION).encode())
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(str((part.dtype, part.shape)).encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode())
+    return digest.hexdigest()
+
+
+def cached_grid(key, compute, cache_dir=CACHE_DIR):
+    '''
+    Load the grid stored under `key`, or compute it and store it as a
+    compressed .npz. Pass cache_dir=None to disable caching.'''
+    if cache_dir is None:
+        return compute()
+    path = os.path.join(cache_dir, f"{key}.npz")
+    if os.path.exists(path):
+        with np.load(path) as stored:
+            return stored['grid']
+    grid = compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_path, grid=grid)
+    os.replace(tmp_path, path)
+    return grid
+
+
+def grid_axes(x, y, resolution=100, extent=None):
+    '''
+    Evenly spaced axes spanning the data, or `extent` ((xmin, xmax), (ymin, ymax))
+    when given; resolution is an int or (nx, ny).'''
+    nx, ny = (resolution, resolution) if np.isscalar(resolution) else resolution
+    (x0, x1), (y0, y1) = extent or ((np.min(x), np.max(x)), (np.min(y), np.max(y)))
+    return np.linspace(x0, x1, nx), np.linspace(y0, y1, ny)
+
+
+def surface_grid(x, y, values, resolution=100, method='linear', cache_dir=CACHE_DIR, workers=None, extent=None):
+    '''
+    Interpolate a surface (DEM, rock layer) onto a regular grid.
+    Returns (xi, yi, zi) with zi shaped (len(yi), len(xi)) as go.Surface expects.'''
+    x, y, values = (np.asarray(a, dtype=float) for a in (x, y, values))
+    xi, yi = grid_axes(x, y, resolution, extent)
+
+    def compute():
+        gx, gy = np.meshgrid(xi, yi)
+        targets = np.column_stack([gx.ravel(), gy.ravel()])
+        return interpolate(np.column_stack([x, y]), values, targets, method, workers).reshape(gy.shape)
+
+    key = cache_key('surface', x, y, values, xi, yi, method)
+    return xi, yi, cached_grid(key, compute, cache_dir)
+
+
+def volume_slices(x, y, z, values, z_levels, resolution=100, method='linear', cache_dir=CACHE_DIR, workers=None,
+                  extent=None):
+    '''
+    Interpolate a 3D point cloud (e.g. TDS) onto horizontal slices at `z_levels`.
+    Returns (xi, yi, slices) with slices shaped (len(z_levels), len(yi), len(xi)).'''
+    x, y, z, values = (np.asarray(a, dtype=float) for a in (x, y, z, values))
+    z_levels = np.atleast_1d(np.asarray(z_levels, dtype=float))
+    xi, yi = grid_axes(x, y, resolution, extent)
+
+    def compute():
+        gz, gy, gx = np.meshgrid(z_levels, yi, xi, indexing='ij')
+        targets = np.column_stack([gx.ravel(), gy.ravel(), gz.ravel()])
+        return interpolate(np.column_stack([x, y, z]), values, targets, method, workers).reshape(gz.shape)
+
+    key = cache_key('volume', x, y, z, values, xi, yi, z_levels, method)
+    return xi, yi, cached_grid(key, compute, cache_dir)
+
+
+def volume_slice(x, y, z, values, z_level, resolution=100, method='linear', cache_dir=CACHE_DIR, workers=None,
+                 extent=None):
+    xi, yi, slices = volume_slices(x, y, z, values, [z_level], resolution, method, cache_dir, workers, extent)
+    return xi, yi, slices[0]
@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+
+from figure_fridays.loaders import read_zipped_csv
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_ZIP = os.path.join(HERE, 'fig-friday-data-july-4-2025.zip')
+CACHE_DIR = os.path.join(HERE, '.data_cache')
+
+# Only the columns the 3D figure uses, parsed straight to float32
+MODEL_GRID_SCHEMA = {
+    'Longitude': np.float32,
+    'Latitude': np.float32,
+    'xkm': np.float32,
+    'ykm': np.float32,
+    'zkm': np.float32,
+    'dem_m': np.float32,
+    'mean_tds': np.float32,
+    'sigma_tds': np.float32,
+}
+
+ROCK_LAYER_SCHEMA = {
+    'xkm': np.float32,
+    'ykm': np.float32,
+    'mean_pred': np.float32,
+    'sigma_pred': np.float32,
+}
+
+
+def load_model_grid(zip_path=DATA_ZIP, cache=True):
+    return read_zipped_csv(zip_path, 'model-grid-subsample.csv', schema=MODEL_GRID_SCHEMA,
+                           cache_dir=CACHE_DIR if cache else None)
+
+
+def load_rock_layer(layer, zip_path=DATA_ZIP, cache=True):
+    return read_zipped_csv(zip_path, f'rock-layer-{layer}.csv', schema=ROCK_LAYER_SCHEMA,
+                           cache_dir=CACHE_DIR if cache else None)
@@ -0,0 +1,68 @@
+import numpy as np
+
+# Default vertex budgets for the initial (overview) render
+SURFACE_BUDGET = 2_500
+POINT_BUDGET = 2_000
+
+
+def _keep_every(n, step):
+    '''Every `step`-th index, always keeping the last one so the surface edge is preserved.'''
+    return np.unique(np.r_[np.arange(0, n, step), n - 1])
+
+
+def decimate_grid(xi, yi, zi, max_vertices=SURFACE_BUDGET):
+    '''
+    Downsample a regular-grid surface by a uniform stride until it has at most
+    `max_vertices` vertices. zi is shaped (len(yi), len(xi)), as for go.Surface.'''
+    n = zi.size
+    if n <= max_vertices:
+        return xi, yi, zi
+    step = int(np.ceil(np.sqrt(n / max_vertices)))
+    # Keeping the last row/column can add one; bump the stride until it fits
+    while True:
+        cols, rows = _keep_every(len(xi), step), _keep_every(len(yi), step)
+        if len(cols) * len(rows) <= max_vertices:
+            return xi[cols], yi[rows], zi[np.ix_(rows, cols)]
+        step += 1
+
+
+def crop_grid(xi, yi, zi, x_range, y_range):
+    cols = (xi >= x_range[0]) & (xi <= x_range[1])
+    rows = (yi >= y_range[0]) & (yi <= y_range[1])
+    return xi[cols], yi[rows], zi[np.ix_(rows, cols)]
+
+
+def region_mask(x, y, x_range=None, y_range=None):
+    mask = np.ones(len(x), dtype=bool)
+    if x_range is not None:
+        mask &= (x >= x_range[0]) & (x <= x_range[1])
+    if y_range is not None:
+        mask &= (y >= y_range[0]) & (y <= y_range[1])
+    return mask
+
+
+def subsample_points(x, y, z, budget=POINT_BUDGET, seed=0):
+    '''
+    Indices of at most `budget` points, spread evenly through space: the
+    bounding box is cut into ~budget voxels and one random point is kept per
+    occupied voxel, then topped up / trimmed at random to hit the budget.
+    Deterministic for a given seed so repeated renders ship the same points.'''
+    n = len(x)
+    if n <= budget:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    coords = np.column_stack([x, y, z]).astype(float)
+    lo, hi = coords.min(axis=0), coords.max(axis=0)
+    cells = max(int(round(budget ** (1 / 3))), 1)
+    voxel = np.minimum(((coords - lo) / np.where(hi > lo, hi - lo, 1) * cells).astype(int), cells - 1)
+    voxel_id = np.ravel_multi_index(voxel.T, (cells, cells, cells))
+
+    order = rng.permutation(n)
+    _, first = np.unique(voxel_id[order], return_index=True)
+    keep = order[first]
+    if len(keep) > budget:
+        keep = rng.choice(keep, budget, replace=False)
+    elif len(keep) < budget:
+        rest = np.setdiff1d(np.arange(n), keep)
+        keep = np.concatenate([keep, rng.choice(rest, budget - len(keep), replace=False)])
+    return np.sort(keep)
@@ -0,0 +1,216 @@
+import numpy as np
+import dash
+from dash import dcc, html, Input, Output, State
+import dash_bootstrap_components as dbc
+import plotly.graph_objects as go
+
+from figure_fridays.memory import add_memory_route, register
+from figure_fridays.payload import add_compression, encode_arrays
+from figure_fridays.week_27.helper import load_model_grid, load_rock_layer
+from figure_fridays.week_27.grids import surface_grid, volume_slices, volume_slice
+from figure_fridays.week_27.lod import (decimate_grid, region_mask, subsample_points,
+                                        SURFACE_BUDGET, POINT_BUDGET)
+
+# Resolutions of the full grids (interpolated once, then cached on disk)
+DEM_RES = 100
+ROCK_RES = 200
+SLICE_RES = 100
+N_SLICES = 25
+
+# Sub-region requests are re-interpolated at this resolution with larger budgets
+DETAIL_RES = 150
+DETAIL_SURFACE_BUDGET = 4 * SURFACE_BUDGET
+DETAIL_POINT_BUDGET = 4 * POINT_BUDGET
+
+# Load data
+df = load_model_grid()
+df = df[df.dem_m > df.zkm * 1e3]
+
+x = df['xkm'].to_numpy(np.float64) * 1e3
+y = df['ykm'].to_numpy(np.float64) * 1e3
+z = df['zkm'].to_numpy(np.float64) * 1e3
+u = df['mean_tds'].to_numpy(np.float64)
+dem_m = df['dem_m'].to_numpy(np.float64)
+
+rocks = {}
+for layer in (1, 2):
+    rock = load_rock_layer(layer)
+    rocks[layer] = (rock['xkm'].to_numpy(np.float64) * 1e3,
+                    rock['ykm'].to_numpy(np.float64) * 1e3,
+                    rock['mean_pred'].to_numpy(np.float64))
+
+z_levels = np.linspace(z.min(), z.max(), N_SLICES)
+
+# Overview grids
+dem_grid = surface_grid(x, y, dem_m, resolution=DEM_RES)
+rock_grids = {layer: surface_grid(*points, resolution=ROCK_RES) for layer, points in rocks.items()}
+slice_xi, slice_yi, salinity_slices = volume_slices(x, y, z, u, z_levels, resolution=SLICE_RES)
+
+x_bounds = [float(x.min()), float(x.max())]
+y_bounds = [float(y.min()), float(y.max())]
+
+# Memory accounting (/_memory)
+register('week_27.df', lambda: df, owner=__name__)
+register('week_27.points', lambda: {'x': x, 'y': y, 'z': z, 'u': u, 'dem_m': dem_m}, owner=__name__)
+register('week_27.rocks', lambda: rocks, owner=__name__)
+register('week_27.grids', lambda: {'dem': dem_grid, 'rocks': rock_grids, 'slices': salinity_slices}, owner=__name__)
+
+ROCK_COLORS = {1: 'rgba(255,0,0,1)', 2: 'rgba(0,255,0,1)'}
+SALINITY_TICKS = [400, 1000, 5000, 10000]
+
+
+def dem_trace(xi, yi, zi):
+    return go.Surface(x=xi, y=yi, z=zi, colorscale='Earth', name='Land surface',
+                      showscale=False, showlegend=True, opacity=1.0)
+
+
+def rock_trace(layer, xi, yi, zi):
+    color = ROCK_COLORS[layer]
+    return go.Surface(x=xi, y=yi, z=zi, surfacecolor=np.zeros_like(zi),
+                      colorscale=[[0, color], [1, color]], name=f'Rock Layer {layer}',
+                      showscale=False, showlegend=True, opacity=0.4)
+
+
+def groundwater_trace(idx):
+    return go.Scatter3d(
+        x=x[idx], y=y[idx], z=z[idx],
+        mode='markers',
+        name='Groundwater salinity',
+        showlegend=True,
+        marker=dict(size=3, symbol='square', colorscale='RdYlBu_r', color=np.log10(u[idx]), showscale=False),
+        hovertemplate=
+            'Easting: %{x:.0f} m<br>' +
+            'Northing: %{y:.0f} m<br>' +
+            'Elevation: %{z:.0f} m<br>' +
+            'TDS: %{customdata[0]:.0f} mg/L<br>' +
+            'log10(TDS): %{marker.color:.2f}<extra></extra>',
+        customdata=np.stack([u[idx]], axis=-1)
+    )
+
+
+def slice_trace(xi, yi, salinity, z_level):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        color = np.log10(salinity)
+    return go.Surface(
+        x=xi, y=yi, z=np.full_like(salinity, z_level), surfacecolor=color,
+        cmin=np.log10(400), cmax=np.log10(10000), colorscale='RdYlBu_r', opacity=0.7,
+        showscale=True,
+        colorbar=dict(title=dict(text='Salinity (mg/L)', side='right'), x=1.02, len=0.5, ticks='outside',
+                      tickvals=np.log10(SALINITY_TICKS), ticktext=SALINITY_TICKS),
+        name='Salinity slice', showlegend=True
+    )
+
+
+def build_traces(region, z_index):
+    '''
+    Traces for the overview (region=None) or for a detail sub-region
+    {'x': [x0, x1], 'y': [y0, y1]}; every surface and the point cloud is
+    decimated to its vertex budget so the payload stays bounded.'''
+    z_level = z_levels[z_index]
+    if region is None:
+        surface_budget, point_budget = SURFACE_BUDGET, POINT_BUDGET
+        dem = dem_grid
+        rock_surfaces = rock_grids
+        salinity = (slice_xi, slice_yi, salinity_slices[z_index])
+        candidates = np.arange(len(x))
+    else:
+        surface_budget, point_budget = DETAIL_SURFACE_BUDGET, DETAIL_POINT_BUDGET
+        extent = (region['x'], region['y'])
+        # Every zoom picks a new extent, so detail grids skip the disk cache (it keeps the overview grids only)
+        dem = surface_grid(x, y, dem_m, resolution=DETAIL_RES, extent=extent, cache_dir=None)
+        rock_surfaces = {layer: surface_grid(*points, resolution=DETAIL_RES, extent=extent, cache_dir=None)
+                         for layer, points in rocks.items()}
+        salinity = volume_slice(x, y, z, u, z_level, resolution=DETAIL_RES, extent=extent, cache_dir=None)
+        candidates = np.flatnonzero(region_mask(x, y, region['x'], region['y']))
+
+    idx = candidates[subsample_points(x[candidates], y[candidates], z[candidates], point_budget)]
+    traces = [dem_trace(*decimate_grid(*dem, surface_budget)), groundwater_trace(idx)]
+    traces += [rock_trace(layer, *decimate_grid(*grid, surface_budget)) for layer, grid in rock_surfaces.items()]
+    traces.append(slice_trace(*decimate_grid(*salinity, surface_budget), z_level))
+    return traces
+
+
+def count_vertices(traces):
+    return sum(np.size(t.z) for t in traces)
+
+
+# Initialize app
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+add_memory_route(app.server, owner=__name__)
+add_compression(app.server)
+app.title = "Groundwater Salinity"
+
+app.layout = dbc.Container([
+    html.H1("Groundwater salinity", className="my-3"),
+    dbc.Row([
+        dbc.Col([
+            html.Label("Easting range (m)"),
+            dcc.RangeSlider(id='x-range', min=x_bounds[0], max=x_bounds[1], value=x_bounds,
+                            marks=None, tooltip={"placement": "bottom"}),
+            html.Label("Northing range (m)"),
+            dcc.RangeSlider(id='y-range', min=y_bounds[0], max=y_bounds[1], value=y_bounds,
+                            marks=None, tooltip={"placement": "bottom"}),
+        ], md=6),
+        dbc.Col([
+            html.Label("Z-slice"),
+            dcc.Slider(id='z-slice', min=0, max=N_SLICES - 1, step=1, value=0,
+                       marks={i: f'{z_levels[i]:.0f} m' for i in range(0, N_SLICES, 6)}),
+        ], md=4),
+        dbc.Col([
+            dbc.Button("Load detail", id='detail-button', color='primary', n_clicks=0, className="me-2"),
+            dbc.Button("Reset", id='reset-button', color='secondary', n_clicks=0),
+            html.Div(id='lod-info', className="text-muted mt-2"),
+        ], md=2),
+    ], className="mb-3"),
+    dcc.Store(id='detail-region'),
+    dcc.Loading(dcc.Graph(id='salinity-graph', style={'height': '80vh'})),
+], fluid=True)
+
+
+@app.callback(
+    Output('detail-region', 'data'),
+    Input('detail-button', 'n_clicks'),
+    Input('reset-button', 'n_clicks'),
+    State('x-range', 'value'),
+    State('y-range', 'value'),
+    prevent_initial_call=True
+)
+def set_detail_region(detail_clicks, reset_clicks, x_range, y_range):
+    if dash.callback_context.triggered_id == 'reset-button':
+        return None
+    if x_range == x_bounds and y_range == y_bounds:
+        return None
+    return {'x': x_range, 'y': y_range}
+
+
+@app.callback(
+    Output('salinity-graph', 'figure'),
+    Output('lod-info', 'children'),
+    Input('detail-region', 'data'),
+    Input('z-slice', 'value')
+)
+def update_figure(region, z_index):
+    traces = build_traces(region, z_index)
+    fig = go.Figure(data=traces)
+    fig.update_layout(
+        title='<b>Groundwater salinity</b>',
+        margin=dict(l=20, r=50, b=20, t=60),
+        scene=dict(
+            xaxis=dict(title='Easting (m)', showbackground=True, backgroundcolor='gray'),
+            yaxis=dict(title='Northing (m)', showbackground=True, backgroundcolor='gray'),
+            zaxis=dict(title='Elevation (m)', showbackground=True, backgroundcolor='gray'),
+            aspectratio=dict(x=1, y=1, z=0.25),
+            camera=dict(up=dict(x=0, y=0, z=1), center=dict(x=0, y=0, z=-0.2), eye=dict(x=-1., y=-1.3, z=1.))
+        ),
+        legend=dict(x=0, y=0.8, bgcolor='rgb(230,230,230)', bordercolor='black', borderwidth=2,
+                    title='<b> Explanation </b><br> (click each to toggle) <br>'),
+        uirevision='salinity'
+    )
+    mode = "Overview" if region is None else "Detail region"
+    return encode_arrays(fig), f"{mode}: {count_vertices(traces):,} vertices"
+
+
+server = app.server
+
+if __name__ == "__main__":
+    app.run(debug=True)
@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+KEY_COLS = ['Area', 'Category', 'Variable', 'Unit']
+LOAD_COLS = KEY_COLS + ['Area type', 'Date', 'Value']
+AGGS = ('auto', 'sum', 'mean', 'max')
+
+
+def is_rate_unit(unit):
+    '''
+    Rates (%, gCO2/kWh, ...) are averaged over time, flows (TWh, mtCO2) are summed.'''
+    return '%' in unit or '/' in unit
+
+
+class ElectricityCube:
+    '''
+    Load-time aggregate of the monthly electricity dataset.
+
+    Every (Area, Category, Variable, Unit) combination becomes one row of a dense
+    series x month array; yearly sum/count/max rollups are computed once so callbacks
+    only index into arrays instead of regrouping the raw monthly rows.'''
+
+    def __init__(self, df):
+        keys = df[KEY_COLS].astype(str)
+        series = keys.drop_duplicates().sort_values(KEY_COLS).reset_index(drop=True)
+        series_pos = pd.MultiIndex.from_frame(series).get_indexer(pd.MultiIndex.from_frame(keys))
+
+        # Per-dimension integer codes for every series, plus label <-> code lookups
+        self.labels = {}
+        self.codes = {}
+        self._lookup = {}
+        for col in KEY_COLS:
+            cat = pd.Categorical(series[col])
+            self.labels[col] = np.asarray(cat.categories)
+            self.codes[col] = cat.codes.astype(np.int32)
+            self._lookup[col] = {label: code for code, label in enumerate(self.labels[col])}
+
+        # Contiguous month axis
+        dates = pd.to_datetime(df['Date'])
+        month_no = (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()
+        first, last = month_no.min(), month_no.max()
+        self.months = pd.period_range(pd.Period(year=first // 12, month=first % 12 + 1, freq='M'),
+                                      periods=last - first + 1, freq='M')
+        self.month_years = self.months.year.to_numpy()
+
+        self.values = np.full((len(series), len(self.months)), np.nan)
+        self.values[series_pos, month_no - first] = pd.to_numeric(df['Value'], errors='coerce').to_numpy()
+
+        # Yearly rollups, one column per year
+        year_starts = np.flatnonzero(np.r_[True, self.month_years[1:] != self.month_years[:-1]])
+        self.years = self.month_years[year_starts]
+        present = ~np.isnan(self.values)
+        self.year_count = np.add.reduceat(present.astype(np.int16), year_starts, axis=1)
+        self.year_sum = np.add.reduceat(np.where(present, self.values, 0.0), year_starts, axis=1)
+        self.year_sum[self.year_count == 0] = np.nan
+        self.year_max = np.fmax.reduceat(self.values, year_starts, axis=1)
+
+        self.rate = np.array([is_rate_unit(u) for u in self.labels['Unit']])[self.codes['Unit']]
+
+        # Country vs aggregate region (EU, Europe, ...) when the dataset says so
+        if 'Area type' in df.columns:
+            self.area_types = df.drop_duplicates('Area').set_index('Area')['Area type'].astype(str).to_dict()
+        else:
+            self.area_types = {}
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls(pd.read_csv(path, usecols=lambda col: col in LOAD_COLS))
+
+    def __len__(self):
+        return len(self.codes['Area'])
+
+    # --- Lookup ---
+
+    def select(self, rows=None, **filters):
+        '''
+        Positions of the series matching every filter, e.g. select(area=['France', 'Spain'], unit='TWh').
+        Each filter takes a label or a list of labels; `rows` restricts the search to a previous selection.'''
+        mask = np.ones(len(self), dtype=bool)
+        for name, wanted in filters.items():
+            if wanted is None:
+                continue
+            col = name.capitalize()
+            if isinstance(wanted, str) or not np.iterable(wanted):
+                wanted = [wanted]
+            codes = [self._lookup[col][w] for w in wanted if w in self._lookup[col]]
+            mask &= np.isin(self.codes[col], codes)
+        positions = np.flatnonzero(mask)
+        if rows is not None:
+            positions = np.intersect1d(positions, rows)
+        return positions
+
+    def matching(self, col, text):
+        '''Labels of a dimension containing `text` (case-insensitive).'''
+        return [label for label in self.labels[col] if text.lower() in label.lower()]
+
+    def areas(self, area_type=None):
+        '''Area labels, optionally only those of one 'Area type' (e.g. 'Country').'''
+        if area_type is None or not self.area_types:
+            return list(self.labels['Area'])
+        return [a for a in self.labels['Area'] if self.area_types.get(a) == area_type]
+
+    def keys(self, rows, cols=KEY_COLS):
+        return pd.DataFrame({col: self.labels[col][self.codes[col][rows]] for col in cols})
+
+    # --- Arrays ---
+
+    def monthly(self, rows):
+        return self.values[rows]
+
+    def yearly(self, rows, agg='auto'):
+        if agg == 'auto':
+            return np.where(self.rate[rows, None], self.yearly(rows, 'mean'), self.yearly(rows, 'sum'))
+        if agg == 'sum':
+            return self.year_sum[rows]
+        if agg == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return self.year_sum[rows] / self.year_count[rows]
+        if agg == 'max':
+            return self.year_max[rows]
+        raise ValueError(f"Unknown aggregation {agg!r}, expected one of {AGGS}")
+
+    # --- Query API ---
+
+    def frame(self, rows, freq='year', agg='auto'):
+        '''Long DataFrame (keys, Year or Date, Value) for the given series, empty periods dropped.'''
+        if freq == 'year':
+            block, period_col, periods = self.yearly(rows, agg), 'Year', self.years
+        elif freq == 'month':
+            block, period_col, periods = self.monthly(rows), 'Date', self.months.to_timestamp()
+        else:
+            raise ValueError(f"Unknown frequency {freq!r}, expected 'year' or 'month'")
+        out = self.keys(np.repeat(rows, len(periods)))
+        out[period_col] = np.tile(periods, len(rows))
+        out['Value'] = block.ravel()
+        return out.dropna(subset=['Value']).reset_index(drop=True)
+
+    def slice(self, freq='year', agg='auto', **filters):
+        return self.frame(self.select(**filters), freq=freq, agg=agg)
+
+    def rollup(self, by=('Category', 'Variable', 'Unit'), freq='year', agg='auto', rows=None, **filters):
+        '''
+        Combine the selected series over every dimension not listed in `by`
+        (the default sums across areas, i.e. an all-areas view per variable).'''
+        rows = self.select(rows=rows, **filters)
+        by = list(by)
+        group_codes = np.stack([self.codes[col][rows] for col in by], axis=1) if by else np.zeros((len(rows), 1), int)
+        groups, group_of = np.unique(group_codes, axis=0, return_inverse=True)
+        group_of = group_of.ravel()
+
+        if freq == 'year':
+            sums, counts, maxes = self.year_sum[rows], self.year_count[rows], self.year_max[rows]
+            periods, period_col = self.years, 'Year'
+        else:
+            sums = self.values[rows]
+            counts = (~np.isnan(sums)).astype(np.int16)
+            maxes = sums
+            periods, period_col = self.months.to_timestamp(), 'Date'
+
+        total = np.zeros((len(groups), len(periods)))
+        count = np.zeros((len(groups), len(periods)))
+        peak = np.full((len(groups), len(periods)), np.nan)
+        np.add.at(total, group_of, np.nan_to_num(sums))
+        np.add.at(count, group_of, counts)
+        np.fmax.at(peak, group_of, maxes)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+        total[count == 0] = np.nan
+        if agg == 'auto':
+            rate = np.zeros(len(groups), dtype=bool)
+            np.logical_or.at(rate, group_of, self.rate[rows])
+            block = np.where(rate[:, None], mean, total)
+        else:
+            block = {'sum': total, 'mean': mean, 'max': peak}.get(agg)
+            if block is None:
+                raise ValueError(f"Unknown aggregation {agg!r}, expected one of {AGGS}")
+
+        out = pd.DataFrame({col: np.repeat(self.labels[col][groups[:, i]], len(periods))
+                            for i, col in enumerate(by)})
+        out[period_col] = np.tile(periods, len(groups))
+        out['Value'] = block.ravel()
+        return out.dropna(subset=['Value']).reset_index(drop=True)
+
+    def rank(self, year, ascending=False, agg='auto', **filters):
+        '''Areas ordered by their yearly value for the filtered series, with a 1-based Rank column.'''
+        ranked = self.rollup(by=('Area',), freq='year', agg=agg, **filters)
+        ranked = ranked[ranked['Year'] == year].drop(columns='Year')
+        ranked = ranked.sort_values('Value', ascending=ascending, kind='stable').reset_index(drop=True)
+        ranked['Rank'] = np.arange(1, len(ranked) + 1)
+        return ranked
@@ -1,28 +1,50 @@
-import pandas as pd
+import os
+
+import numpy as np
 import dash
 from dash import dcc, html
-import plotly.express as px
 from dash.dependencies import Input, Output
 import dash_bootstrap_components as dbc
 
-# Load your dataset
-df = pd.read_csv("../dataset/europe_monthly_electricity.csv")
+from figure_fridays.week_30.app.cube import ElectricityCube
+from figure_fridays.fastfig import enable_fast_json, figure, px_bars, px_lines, px_layout
+from figure_fridays.memory import add_memory_route, register
+
+enable_fast_json()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Load your dataset into the aggregate cube
+cube = ElectricityCube.from_csv(os.path.join(HERE, "..", "dataset", "europe_monthly_electricity.csv"))
 
 # Use Electricity demand (TWh) as proxy for generation
-gen_df = df[(df['Category'] == 'Electricity demand') & (df['Unit'] == 'TWh')].copy()
-gen_df['Year'] = pd.to_datetime(gen_df['Date']).dt.year
+GEN_CATEGORY = 'Electricity demand'
+gen_rows = cube.select(category=GEN_CATEGORY, unit='TWh')
+gen_values = cube.monthly(gen_rows)
+
+countries = sorted(set(cube.keys(gen_rows)['Area']))
+ranked_areas = cube.areas('Country')
+units = list(cube.labels['Unit'])
+years = [int(y) for y in cube.years[~np.isnan(cube.yearly(gen_rows)).all(axis=0)]]
+
+# Emission series: any category or variable mentioning emissions
+emission_rows = np.union1d(
+    cube.select(category=cube.matching('Category', 'emission')),
+    cube.select(variable=cube.matching('Variable', 'emission'))
+)
 
-countries = sorted(gen_df['Area'].unique())
-units = sorted(df['Unit'].unique())
-years = sorted(gen_df['Year'].unique())
+min_gen = np.nanmin(gen_values)
+max_gen = np.nanmax(gen_values)
 
-min_gen = gen_df['Value'].min()
-max_gen = gen_df['Value'].max()
+# Memory accounting (/_memory)
+register('week_30.cube', lambda: cube, owner=__name__)
+register('week_30.gen_values', lambda: gen_values, owner=__name__)
 
 # External stylesheet for Bootstrap and icons
 external_stylesheets = [dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME]
 
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+add_memory_route(app.server, owner=__name__)
 
 # DBC Filter Card
 filter_card = dbc.Card([
@@ -42,8 +64,9 @@ filter_card = dbc.Card([
                 dcc.Dropdown(
                     id='country_dd',
                     options=[{'label': f"{c}", 'value': c} for c in countries],
-                    value=countries[0] if countries else None,
-                    clearable=False,
+                    value=countries[:1],
+                    multi=True,
+                    placeholder="Select countries...",
                     className="mb-2"
                 ),
                 html.Small(f"Available: {len(countries)} countries", className="text-muted"),
@@ -116,37 +139,60 @@ app.layout = dbc.Container([
      Input('year-selector', 'value'),
      Input('gen_slider', 'value')]
 )
-def update_graph(selected_country, selected_unit, selected_year, gen_range):
-    filtered_df = gen_df[
-        (gen_df['Area'] == selected_country) &
-        (gen_df['Unit'] == selected_unit) &
-        (gen_df['Year'] == selected_year) &
-        (gen_df['Value'] >= gen_range[0]) &
-        (gen_df['Value'] <= gen_range[1])
-    ]
-    if not filtered_df.empty:
-        top_value = filtered_df['Value'].max()
-        top_info = html.H2(f"{selected_country}: {top_value} {selected_unit} in {selected_year}")
+def update_graph(selected_countries, selected_unit, selected_year, gen_range):
+    if isinstance(selected_countries, str):
+        selected_countries = [selected_countries]
+    if not selected_countries:
+        return {}, {}, html.H2("Select at least one country.")
+
+    # One indexed lookup for every selected country
+    rows = cube.select(area=selected_countries, category=GEN_CATEGORY, unit=selected_unit)
+    label = selected_countries[0] if len(selected_countries) == 1 else f"{len(selected_countries)} countries"
+
+    # Peak month per country within the selected year and generation range
+    month_values = cube.monthly(rows)[:, cube.month_years == selected_year]
+    month_values = np.where((month_values >= gen_range[0]) & (month_values <= gen_range[1]), month_values, np.nan)
+    area_codes = cube.codes['Area'][rows]
+    peaks = np.full(len(cube.labels['Area']), np.nan)
+    if month_values.size:
+        np.fmax.at(peaks, area_codes, np.fmax.reduce(month_values, axis=1))
+    if not np.isnan(peaks).all():
+        best = int(np.nanargmax(peaks))
+        top_country, top_value = cube.labels['Area'][best], peaks[best]
+        if len(selected_countries) == 1:
+            heading = f"{top_country}: {top_value} {selected_unit} in {selected_year}"
+        else:
+            heading = f"{top_country} leads {label}: {top_value} {selected_unit} in {selected_year}"
+        top_info = [html.H2(heading)]
+        ranking = cube.rank(selected_year, area=ranked_areas, category=GEN_CATEGORY, unit=selected_unit)
+        if not ranking.empty:
+            leader = ranking.iloc[0]
+            top_info.append(html.P(f"Top country in {selected_year}: {leader['Area']} "
+                                   f"({leader['Value']:,.1f} {selected_unit})", className="text-muted"))
     else:
         top_info = html.H2("No data for selection.")
 
-    # For the bar, also show a trend for this country (across years and unit)
-    trend_df = gen_df[(gen_df['Area'] == selected_country) & (gen_df['Unit'] == selected_unit)]
-    bar_fig = px.bar(trend_df, x="Year", y="Value", title=f"Generation Over Time - {selected_country}",
-                     labels={"Value": f"Generation ({selected_unit})", "Year": "Year"})
+    # For the bar, also show a trend for these countries (across years and unit)
+    trend_df = cube.frame(rows, freq='year')
+    y_label = f"Generation ({selected_unit})"
+    bar_fig = figure(
+        px_bars(trend_df['Year'], trend_df['Value'], 'Year', y_label, color=('Country', trend_df['Area'])),
+        px_layout(f"Generation Over Time - {label}", 'Year', y_label, 'Country', barmode='group')
+    )
 
     # Emissions chart (if emissions data available)
-    emissions_df = df[
-        ((df['Category'].str.contains('emission', case=False, na=False)) |
-         (df['Variable'].str.contains('emission', case=False, na=False))) &
-        (df['Area'] == selected_country)
-    ].copy()
+    emissions_df = cube.frame(cube.select(rows=emission_rows, area=selected_countries), freq='year')
     if not emissions_df.empty:
-        emissions_df['Year'] = pd.to_datetime(emissions_df['Date']).dt.year
-        emissions_fig = px.line(
-            emissions_df, x='Year', y='Value', color='Area',
-            labels={"Value": "Emissions (as reported)", "Year": "Year", "Area": "Country"},
-            title=f"Emissions for {selected_country} Over Time"
+        series = emissions_df['Variable'] + ' (' + emissions_df['Unit'] + ')'
+        if len(selected_countries) == 1:
+            line_args = dict(color=('Series', series))
+            legend_title = 'Series'
+        else:
+            line_args = dict(color=('Country', emissions_df['Area']), line_dash=('Series', series))
+            legend_title = 'Country, Series'
+        emissions_fig = figure(
+            px_lines(emissions_df['Year'], emissions_df['Value'], 'Year', "Emissions (as reported)", **line_args),
+            px_layout(f"Emissions for {label} Over Time", 'Year', "Emissions (as reported)", legend_title)
         )
     else:
         emissions_fig = {}
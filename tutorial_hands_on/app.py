@@ -1,7 +1,13 @@
 from dash import dcc, html, callback, Input, Output, Dash
 from callback_error_plugin import add_error_notifications
+from callback_metrics_plugin import add_callback_metrics
+from callback_profiler_plugin import add_callback_profiler
+from callback_circuit_breaker_plugin import add_circuit_breaker
 
 add_error_notifications("here is the error message")
+add_callback_metrics()
+add_callback_profiler(callbacks=["output-div.children"], threshold=0.5)
+add_circuit_breaker(placeholders={"output-div.children": "The result is temporarily unavailable."})
 
 app = Dash()
 app.layout = html.Div([
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+import flask
+from dash import hooks
+
+from callback_plugin_common import UPDATE_PATH, callback_name, error_is_handled, require_local
+
+
+class CircuitOpenError(Exception):
+    """Raised by CircuitBreaker.call while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast on a dependency that keeps failing.
+
+    The circuit opens when at least `min_calls` of the last `window` calls were
+    recorded and `failure_rate` of them failed (or ran longer than `slow_call`
+    seconds). While it is open, calls are refused at once. After `reset_timeout`
+    seconds it is half-open: the next call goes ahead as a trial and the rest
+    are still refused. A successful trial closes the circuit; a failed one
+    opens it again for twice as long, up to `max_timeout`.
+    """
+
+    def __init__(self, name, window=20, min_calls=5, failure_rate=0.5, reset_timeout=30.0, max_timeout=300.0,
+                 slow_call=None):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.reset_timeout = reset_timeout
+        self.max_timeout = max_timeout
+        self.slow_call = slow_call
+        self.state = "closed"
+        self.outcomes = deque(maxlen=window)
+        self.timeout = reset_timeout
+        self.opened_at = None
+        self.trial_at = None
+        self.opens = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        True when a call may go ahead now, "trial" when it is the half-open
+        trial (pass trial=True to record); False, counted as a rejection, otherwise.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            # A trial that never reported back (e.g. its worker died) is replaced after a timeout
+            since = self.trial_at if self.state == "half-open" else self.opened_at
+            if now - since >= self.timeout:
+                self.state = "half-open"
+                self.trial_at = now
+                return "trial"
+            self.rejected += 1
+            return False
+
+    def record(self, ok, seconds=None, trial=False):
+        if ok and self.slow_call is not None and seconds is not None and seconds > self.slow_call:
+            ok = False
+        with self._lock:
+            if self.state != "closed":
+                # Calls started before the circuit opened don't count; only the trial does
+                if trial and self.state == "half-open":
+                    if ok:
+                        self._close()
+                    else:
+                        self._reopen()
+                return
+            self.outcomes.append(ok)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_calls and failures >= self.failure_rate * len(self.outcomes):
+                self._open()
+
+    def call(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) with its outcome recorded; CircuitOpenError while the circuit is open."""
+        allowed = self.allow()
+        if not allowed:
+            raise CircuitOpenError(f"{self.name}: circuit open after repeated failures")
+        trial = allowed == "trial"
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record(False, trial=trial)
+            raise
+        self.record(True, time.perf_counter() - start, trial=trial)
+        return result
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.timeout = self.reset_timeout
+        self.opens += 1
+
+    def _reopen(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.timeout = min(self.timeout * 2, self.max_timeout)
+
+    def _close(self):
+        self.state = "closed"
+        self.outcomes.clear()
+        self.timeout = self.reset_timeout
+
+    def status(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self.state,
+                "calls": len(self.outcomes),
+                "failures": self.outcomes.count(False),
+                "opens": self.opens,
+                "rejected": self.rejected,
+                "retry_in": None if self.state != "open" else
+                round(max(self.opened_at + self.timeout - time.monotonic(), 0), 1),
+            }
+
+
+def inputs_key(body):
+    """Digest of a callback request's input and state values."""
+    values = json.dumps([body.get("inputs"), body.get("state")], sort_keys=True, default=str)
+    return hashlib.sha1(values.encode("utf-8")).hexdigest()
+
+
+def placeholder_response(body, placeholders):
+    """The placeholder values for the request's outputs that have one; 204 (no update) if none do."""
+    outputs = body.get("outputs") or []
+    updates = {}
+    for output in outputs if isinstance(outputs, list) else [outputs]:
+        spec = f"{output.get('id')}.{output.get('property')}"
+        if isinstance(output.get("id"), str) and spec in placeholders:
+            updates.setdefault(output["id"], {})[output["property"]] = placeholders[spec]
+    if not updates:
+        return flask.Response(status=204, headers={"X-Circuit-Breaker": "open"})
+    return flask.Response(json.dumps({"multi": True, "response": updates}), mimetype="application/json",
+                          headers={"X-Circuit-Breaker": "open; placeholder"})
+
+
+def add_circuit_breaker(callbacks=(), placeholders=None, window=20, min_calls=5, failure_rate=0.5,
+                        reset_timeout=30.0, max_timeout=300.0, slow_call=None, cache_size=256,
+                        route="_circuit-breakers", local_only=True):
+    """
+    Stop calling a callback that keeps failing.
+
+    Each callback whose output spec contains one of `callbacks` (every callback
+    when empty) gets a CircuitBreaker; raised errors, 5xx responses and runs
+    slower than `slow_call` seconds count as failures. While a circuit is open
+    the callback is not run: the last successful response for the same inputs
+    is served, else the `placeholders` value for each output ('id.prop' ->
+    value), else no update. Once `reset_timeout` has passed, the next live
+    request runs as a trial and its outcome closes or reopens the circuit.
+    Breaker states are served as JSON on `route`.
+    """
+    placeholders = placeholders or {}
+    breakers = {}
+    breakers_lock = threading.Lock()
+    last_good = OrderedDict()
+    cache_lock = threading.Lock()
+    servers_with_on_error = set()
+
+    def wanted(callback):
+        return not callbacks or any(selected in callback for selected in callbacks)
+
+    def breaker_for(callback):
+        with breakers_lock:
+            breaker = breakers.get(callback)
+            if breaker is None:
+                breaker = breakers[callback] = CircuitBreaker(
+                    callback, window=window, min_calls=min_calls, failure_rate=failure_rate,
+                    reset_timeout=reset_timeout, max_timeout=max_timeout, slow_call=slow_call)
+            return breaker
+
+    @hooks.setup()
+    def install(app):
+        server = app.server
+        if app._on_error is not None:
+            servers_with_on_error.add(server)
+
+        @server.before_request
+        def check_circuit():
+            if not flask.request.path.endswith(UPDATE_PATH):
+                return None
+            body = flask.request.get_json(silent=True) or {}
+            callback = callback_name()
+            if not wanted(callback):
+                return None
+            breaker = breaker_for(callback)
+            key = inputs_key(body)
+            allowed = breaker.allow()
+            if allowed:
+                flask.g.circuit = (breaker, key, allowed == "trial", time.perf_counter())
+                return None
+            with cache_lock:
+                cached = last_good.get((callback, key))
+            if cached is not None:
+                return flask.Response(cached, mimetype="application/json",
+                                      headers={"X-Circuit-Breaker": "open; last good"})
+            return placeholder_response(body, placeholders)
+
+        @server.after_request
+        def record_outcome(response):
+            circuit = flask.g.pop("circuit", None)
+            if circuit is None:
+                return response
+            breaker, key, trial, start = circuit
+            failed = flask.g.pop("circuit_error", False) or response.status_code >= 500
+            if not failed and response.status_code == 200 and not response.is_streamed:
+                with cache_lock:
+                    last_good[(breaker.name, key)] = response.get_data()
+                    last_good.move_to_end((breaker.name, key))
+                    while len(last_good) > cache_size:
+                        last_good.popitem(last=False)
+            breaker.record(not failed, time.perf_counter() - start, trial=trial)
+            return response
+
+    # Any error hook replaces Dash's 500 with its return value (None -> no update),
+    # so the error is raised again unless something else is there to answer it
+    @hooks.error(priority=1000)
+    def mark_error(err):
+        flask.g.circuit_error = True
+        if not error_is_handled(servers_with_on_error):
+            raise err
+
+    mark_error.records_only = True
+
+    @hooks.route(name=route)
+    def serve_breakers():
+        require_local(local_only)
+        with breakers_lock:
+            states = [breaker.status() for breaker in breakers.values()]
+        return flask.jsonify(breakers=states, cached_responses=len(last_good))
+
+    return breakers
@@ -1,5 +1,99 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+
+import flask
 from dash import html, hooks, set_props, Input, Output
 
+from callback_plugin_common import callback_name, require_local
+
+
+class ErrorLog:
+    """
+    Callback errors deduplicated by (callback, exception type, message).
+
+    Holds at most `capacity` distinct errors (the least recently seen is
+    dropped first), each with a count, first/last seen times and a few sampled
+    tracebacks: occurrences 1, 2, 4, 8, ... are kept, the newest `samples` of them.
+    Each entry also remembers when its banner was last shown to each of up to
+    `clients` clients.
+    """
+
+    def __init__(self, capacity=100, samples=3, clients=100):
+        self.capacity = capacity
+        self.samples = samples
+        self.clients = clients
+        self.total = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, callback, err):
+        key = (callback, type(err).__name__, str(err))
+        now = time.time()
+        with self._lock:
+            self.total += 1
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                entry = {
+                    "callback": callback,
+                    "type": key[1],
+                    "message": key[2],
+                    "count": 0,
+                    "first_seen": now,
+                    "tracebacks": deque(maxlen=self.samples),
+                    "banners": OrderedDict(),
+                }
+            entry["count"] += 1
+            entry["last_seen"] = now
+            if entry["count"] & (entry["count"] - 1) == 0:
+                entry["tracebacks"].append("".join(traceback.format_exception(type(err), err, err.__traceback__)))
+            self._entries[key] = entry
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            return dict(entry)
+
+    def banner_due(self, entry, client, interval):
+        """
+        Whether `client` should see this error's banner now: the first time, then
+        at most once per `interval` seconds. Other errors and clients don't count.
+        """
+        key = (entry["callback"], entry["type"], entry["message"])
+        now = time.monotonic()
+        with self._lock:
+            stored = self._entries.get(key)
+            if stored is None:
+                return True
+            banners = stored["banners"]
+            last = banners.pop(client, None)
+            due = last is None or now - last >= interval
+            banners[client] = now if due else last
+            while len(banners) > self.clients:
+                banners.popitem(last=False)
+            return due
+
+    def entries(self):
+        with self._lock:
+            return [dict({k: v for k, v in entry.items() if k != "banners"}, tracebacks=list(entry["tracebacks"]))
+                    for entry in reversed(self._entries.values())]
+
+    def summary(self):
+        with self._lock:
+            if not self._entries:
+                return ""
+            latest = next(reversed(self._entries.values()))
+            kinds = len(self._entries)
+            total = self.total
+        text = f"{latest['type']}: {latest['message']} (x{latest['count']})"
+        if kinds > 1:
+            text += f"; {total} errors across {kinds} distinct kinds"
+        return text
+
+
+def client_id():
+    """Stands in for the browser session, which Dash doesn't track: address and user agent."""
+    return f"{flask.request.remote_addr} {flask.request.user_agent.string}"
+
 def generate_error_notification():
     return [
         html.Div(
@@ -30,7 +124,18 @@ def generate_error_notification():
         )
     ]
 
-def add_error_notifications(error_text="there was an error"):
+def add_error_notifications(error_text="there was an error", interval=5.0, capacity=100,
+                            route="_callback-errors", local_only=True):
+    """
+    Show callback errors in a dismissible banner.
+
+    Errors are aggregated in an ErrorLog; the banner is refreshed with the
+    aggregate summary at most once per `interval` seconds for each error, callback
+    and client (an error a client hasn't seen yet always shows immediately).
+    Sampled tracebacks are served as JSON on `route`.
+    """
+    error_log = ErrorLog(capacity=capacity)
+
     @hooks.layout(priority=1)
     def update_layout(layout):
         return generate_error_notification() + (layout if isinstance(layout, list) else [layout])
@@ -46,5 +151,15 @@ def add_error_notifications(error_text="there was an error"):
     
     @ hooks.error()
     def on_error(err):
+        entry = error_log.add(callback_name(), err)
+        if not error_log.banner_due(entry, client_id(), interval):
+            return
         set_props("callback-error-banner-wrapper", dict(style=dict(display="block")))
-        set_props("error-text", dict(children=f"{error_text}: {err}"))
\ No newline at end of file
+        set_props("error-text", dict(children=f"{error_text}: {error_log.summary()}"))
+
+    @hooks.route(name=route)
+    def serve_errors():
+        require_local(local_only)
+        return flask.jsonify(total=error_log.total, errors=error_log.entries())
+
+    return error_log
\ No newline at end of file
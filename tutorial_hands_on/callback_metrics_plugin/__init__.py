@@ -0,0 +1,175 @@
+import threading
+import time
+from bisect import bisect_left
+
+import flask
+from dash import hooks
+
+from callback_plugin_common import UPDATE_PATH, callback_name, error_is_handled, require_local
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Series:
+    """Counters for one callback in one thread; histogram buckets are allocated up front."""
+
+    __slots__ = ("calls", "errors", "latency", "latency_sum", "request", "request_sum", "response", "response_sum")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.request = [0] * (len(SIZE_BUCKETS) + 1)
+        self.request_sum = 0
+        self.response = [0] * (len(SIZE_BUCKETS) + 1)
+        self.response_sum = 0
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.errors += other.errors
+        self.latency_sum += other.latency_sum
+        self.request_sum += other.request_sum
+        self.response_sum += other.response_sum
+        for mine, theirs in ((self.latency, other.latency), (self.request, other.request), (self.response, other.response)):
+            for i, count in enumerate(theirs):
+                mine[i] += count
+
+
+class CallbackMetrics:
+    """
+    Per-callback call counts, errors, latency and payload-size histograms.
+
+    Each worker thread writes only to its own dict of Series, so recording takes
+    no lock; the shards are summed when /metrics is scraped, and the shards of
+    threads that have exited (the dev server starts one per request) are folded
+    into a retired total then. Every gunicorn worker process exposes its own counters.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._shards_lock = threading.Lock()  # only taken the first time a thread records
+
+    def _shard(self):
+        shard = getattr(self._local, "series", None)
+        if shard is None:
+            shard = self._local.series = {}
+            with self._shards_lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def record(self, callback, seconds, request_bytes, response_bytes, error=False):
+        shard = self._shard()
+        series = shard.get(callback)
+        if series is None:
+            series = shard[callback] = Series()
+        series.calls += 1
+        series.errors += bool(error)
+        series.latency[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        series.latency_sum += seconds
+        series.request[bisect_left(SIZE_BUCKETS, request_bytes)] += 1
+        series.request_sum += request_bytes
+        series.response[bisect_left(SIZE_BUCKETS, response_bytes)] += 1
+        series.response_sum += response_bytes
+
+    def snapshot(self):
+        totals = {}
+        with self._shards_lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    # An exited thread won't write again, so its counts can be merged for good
+                    for callback, series in shard.items():
+                        self._retired.setdefault(callback, Series()).merge(series)
+            self._shards = live
+            shards = [shard for _, shard in live] + [self._retired]
+            for shard in shards:
+                for callback, series in list(shard.items()):
+                    totals.setdefault(callback, Series()).merge(series)
+        return totals
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        totals = sorted(self.snapshot().items())
+        lines = []
+
+        def counter(name, help_text, attr):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for callback, series in totals:
+                lines.append(f'{name}{{callback="{_escape(callback)}"}} {getattr(series, attr)}')
+
+        def histogram(name, help_text, buckets, attr):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for callback, series in totals:
+                label = _escape(callback)
+                cumulative = 0
+                for bound, count in zip(buckets + ("+Inf",), getattr(series, attr)):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{callback="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{callback="{label}"}} {getattr(series, attr + "_sum")}')
+                lines.append(f'{name}_count{{callback="{label}"}} {series.calls}')
+
+        counter("dash_callback_calls_total", "Callback requests handled.", "calls")
+        counter("dash_callback_errors_total", "Callback requests that raised or returned a 5xx.", "errors")
+        histogram("dash_callback_latency_seconds", "Server-side callback latency.", LATENCY_BUCKETS, "latency")
+        histogram("dash_callback_request_bytes", "Callback request body size.", SIZE_BUCKETS, "request")
+        histogram("dash_callback_response_bytes", "Callback response body size.", SIZE_BUCKETS, "response")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def add_callback_metrics(route="metrics", local_only=True):
+    metrics = CallbackMetrics()
+    servers_with_on_error = set()
+
+    @hooks.setup()
+    def install(app):
+        server = app.server
+        if app._on_error is not None:
+            servers_with_on_error.add(server)
+
+        @server.before_request
+        def start_timer():
+            if flask.request.path.endswith(UPDATE_PATH):
+                flask.g.callback_metrics_start = time.perf_counter()
+
+        @server.after_request
+        def record_callback(response):
+            start = flask.g.pop("callback_metrics_start", None)
+            if start is not None:
+                metrics.record(
+                    callback_name(),
+                    time.perf_counter() - start,
+                    flask.request.content_length or 0,
+                    response.content_length or 0,
+                    error=flask.g.pop("callback_metrics_error", False) or response.status_code >= 500,
+                )
+            return response
+
+    # Any error hook makes Dash pass callback errors to its handlers, where None means
+    # "no update" (a 200). Only count the error, and raise it again when nothing else handles
+    # it, so the request still fails with a 500 as it would without this plugin.
+    @hooks.error(priority=1000)
+    def mark_error(err):
+        flask.g.callback_metrics_error = True
+        if not error_is_handled(servers_with_on_error):
+            raise err
+
+    mark_error.records_only = True
+
+    @hooks.route(name=route)
+    def serve_metrics():
+        require_local(local_only)
+        return flask.Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    return metrics
@@ -0,0 +1,31 @@
+import flask
+from dash import hooks
+
+UPDATE_PATH = "_dash-update-component"
+# REMOTE_ADDR is an IP address; None when the server gives none (e.g. a unix socket)
+LOCAL_ADDRS = ("127.0.0.1", "::1", None)
+
+
+def callback_name():
+    """The callback's output spec, e.g. 'output-div.children', from the current update request."""
+    body = flask.request.get_json(silent=True) or {}
+    return body.get("output", "unknown")
+
+
+def is_local_request():
+    return flask.request.remote_addr in LOCAL_ADDRS
+
+
+def require_local(local_only=True):
+    """Abort with 403 unless the request comes from this machine (or local_only is False)."""
+    if local_only and not is_local_request():
+        flask.abort(403)
+
+
+def error_is_handled(servers_with_on_error):
+    """
+    Whether anything besides record-only hooks (functions flagged `records_only`)
+    turns callback errors into responses: the app's own on_error or another error hook.
+    """
+    return (flask.current_app._get_current_object() in servers_with_on_error
+            or any(not getattr(hook.func, "records_only", False) for hook in hooks.get_hooks("error")))
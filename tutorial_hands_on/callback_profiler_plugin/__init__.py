@@ -0,0 +1,240 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+import flask
+from dash import hooks
+
+from callback_plugin_common import UPDATE_PATH, callback_name, require_local
+
+def collapse_stack(frame):
+    """Root-first 'func (file:line);...' string, the folded format flame-graph tools read."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class Sampler:
+    """
+    One background thread that samples the stacks of the request threads that
+    are currently registered; it sleeps while no request is being sampled.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, ident):
+        with self._lock:
+            self._active[ident] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="callback-profiler-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, ident):
+        with self._lock:
+            return self._active.pop(ident, None)
+
+    def _run(self):
+        while True:
+            if not self._active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[collapse_stack(frame)] += 1
+
+
+class ProfileStore:
+    """
+    Profiles on disk, one sub-directory per callback: deterministic runs as
+    .pstats, sampled runs as .folded. At most `max_profiles` files are kept;
+    the oldest are deleted first.
+    """
+
+    def __init__(self, directory, max_profiles=50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def _slug(self, callback):
+        return re.sub(r"[^\w.-]+", "_", callback).strip("_")[:100] or "callback"
+
+    def path_for(self, callback, suffix):
+        folder = os.path.join(self.directory, self._slug(callback))
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f"{time.time_ns()}{suffix}")
+
+    def save_pstats(self, callback, profile):
+        profile.dump_stats(self.path_for(callback, ".pstats"))
+        self._evict()
+
+    def save_folded(self, callback, stacks):
+        with open(self.path_for(callback, ".folded"), "w") as fh:
+            fh.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+        self._evict()
+
+    def files(self, callback=None, suffix=""):
+        folders = [self._slug(callback)] if callback else (
+            os.listdir(self.directory) if os.path.isdir(self.directory) else [])
+        found = []
+        for folder in folders:
+            path = os.path.join(self.directory, folder)
+            if os.path.isdir(path):
+                try:
+                    names = os.listdir(path)
+                except FileNotFoundError:
+                    continue
+                found += [os.path.join(path, f) for f in names if f.endswith(suffix)]
+        # Another worker may delete files between the listing and the stat
+        dated = []
+        for path in found:
+            try:
+                dated.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                pass
+        return [path for _, path in sorted(dated)]
+
+    def _evict(self):
+        with self._lock:
+            files = self.files()
+            for path in files[:max(len(files) - self.max_profiles, 0)]:
+                try:
+                    os.remove(path)
+                except OSError:  # includes files another worker already removed
+                    pass
+
+    def top_functions(self, callback, limit=30):
+        files = self.files(callback, ".pstats")
+        if not files:
+            return ""
+        out = io.StringIO()
+        stats = None
+        for path in files:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(path, stream=out)
+                else:
+                    stats.add(path)
+            except FileNotFoundError:
+                pass
+        if stats is None:
+            return ""
+        stats.strip_dirs().sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+    def folded(self, callback):
+        totals = Counter()
+        for path in self.files(callback, ".folded"):
+            try:
+                with open(path) as fh:
+                    lines = fh.readlines()
+            except FileNotFoundError:
+                continue
+            for line in lines:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                totals[stack] += int(count)
+        return "".join(f"{stack} {count}\n" for stack, count in totals.most_common())
+
+    def summary(self):
+        counts = Counter()
+        for path in self.files():
+            counts[(os.path.basename(os.path.dirname(path)), os.path.splitext(path)[1])] += 1
+        return counts
+
+
+def add_callback_profiler(callbacks=(), threshold=None, store_dir="callback_profiles", max_profiles=50,
+                          sample_interval=0.005, route="_profiler", local_only=True):
+    """
+    Profile Dash callbacks and serve the results.
+
+    Callbacks whose output spec contains one of `callbacks` run under cProfile
+    (one at a time; concurrent requests are skipped). When `threshold` (seconds)
+    is set, every other callback is stack-sampled and kept only if it ran at
+    least that long. Browse `/<route>`; `?callback=<output>&view=top` gives the
+    aggregated top functions and `view=flame` the folded stacks for a flame graph.
+    """
+    store = ProfileStore(store_dir, max_profiles)
+    sampler = Sampler(sample_interval)
+    deterministic_lock = threading.Lock()
+
+    def wants_profile(callback):
+        return any(selected in callback for selected in callbacks)
+
+    @hooks.setup()
+    def install(app):
+        server = app.server
+
+        @server.before_request
+        def start_profile():
+            if not flask.request.path.endswith(UPDATE_PATH):
+                return
+            callback = callback_name()
+            flask.g.profiler_start = time.perf_counter()
+            if wants_profile(callback):
+                if deterministic_lock.acquire(blocking=False):
+                    profile = cProfile.Profile()
+                    flask.g.profiler_profile = profile
+                    profile.enable()
+            elif threshold is not None:
+                flask.g.profiler_thread = threading.get_ident()
+                sampler.start(flask.g.profiler_thread)
+
+        @server.after_request
+        def save_profile(response):
+            start = flask.g.pop("profiler_start", None)
+            if start is None:
+                return response
+            elapsed = time.perf_counter() - start
+            profile = flask.g.get("profiler_profile")
+            ident = flask.g.get("profiler_thread")
+            if profile is not None:
+                profile.disable()
+                store.save_pstats(callback_name(), profile)
+            elif ident is not None:
+                stacks = sampler.stop(ident)
+                if stacks and elapsed >= threshold:
+                    store.save_folded(callback_name(), stacks)
+            return response
+
+        # after_request is skipped when an error propagates (debug mode); teardown always runs
+        @server.teardown_request
+        def stop_profile(exc):
+            profile = flask.g.pop("profiler_profile", None)
+            ident = flask.g.pop("profiler_thread", None)
+            if profile is not None:
+                profile.disable()
+                deterministic_lock.release()
+            elif ident is not None:
+                sampler.stop(ident)
+
+    @hooks.route(name=route)
+    def serve_profiles():
+        require_local(local_only)
+        callback = flask.request.args.get("callback")
+        view = flask.request.args.get("view", "top")
+        if not callback:
+            lines = [f"{folder} {kind} {count}" for (folder, kind), count in sorted(store.summary().items())]
+            return flask.Response("\n".join(lines) + "\n", mimetype="text/plain")
+        body = store.folded(callback) if view == "flame" else store.top_functions(callback)
+        return flask.Response(body or "No profiles recorded.\n", mimetype="text/plain")
+
+    return store